@@ -1,15 +1,23 @@
 import hashlib
 import logging
+import multiprocessing
 import os
+import queue
 import re
 import sqlite3
+import threading
 import traceback
 import uuid
-from datetime import datetime
-from logging.handlers import RotatingFileHandler
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from functools import lru_cache
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from pathlib import Path
 from tqdm import tqdm
-from sqlalchemy import BigInteger, Column, create_engine, Float, func, ForeignKey, Index, Integer, String, text, \
-    inspect, Text, UniqueConstraint
+from sqlalchemy import BigInteger, bindparam, Column, create_engine, Float, func, ForeignKey, Index, Integer, MetaData, \
+    select, String, Table, text, inspect, Text, UniqueConstraint
 from sqlalchemy.event import listen
 from sqlalchemy.exc import MultipleResultsFound, SQLAlchemyError
 from sqlalchemy.orm import declarative_base, relationship, Session, sessionmaker
@@ -17,6 +25,23 @@ from sqlalchemy.schema import CreateIndex
 
 # Switches
 limit = 0
+# Rows per set-based statement in the bulk write stages, 0 writes each stage in a single batch
+bulk_batch_size = 999
+# Stream records from DNAGedcom to RootsMagic in batches instead of loading everything first
+stream = 0
+# Import with tuned SQLite settings on the RootsMagic database (WAL journal, no fsync, large cache and mmap).
+# Durability is traded for speed until the end of the run, so back up the .rmtree first.
+fast_import = 0
+# Drop the RootsMagic indexes the importer does not query before writing and build each once afterwards
+defer_indexes = 0
+# Run the Ancestry, FTDNA and MyHeritage transforms in parallel worker processes (ignored when streaming)
+parallel_providers = 0
+# Transform each provider table in chunks of rows spread over this many worker processes, 0 disables.
+# Not used together with limit.
+transform_workers = 0
+# Read and transform each provider in its own thread while the main thread writes the finished batches to RootsMagic.
+# Takes precedence over stream and parallel_providers.
+pipeline = 0
 # Ancestry
 ancestry_matchgroups = 1
 ancestry_matchtrees = 1
@@ -282,6 +307,13 @@ class URLTable(RM_Base):
     idxUrlOwnerType = Index('idxUrlOwnerType', OwnerType)
 
 
+class RootMatchItIdMap(RM_Base):
+    # Define the DNAGedcom source id -> PersonID map RootMatchIt keeps in the RootsMagic file between runs
+    __tablename__ = 'RootMatchItIdMap'
+    SourceID = Column(Text, primary_key=True)
+    PersonID = Column(Integer, nullable=False)
+
+
 Ancestry_Base = declarative_base()
 
 
@@ -792,6 +824,36 @@ def setup_logging():
         root_logger.critical(f"\n\n Start of run - {formatted_datetime} \n")
 
 
+# Worker processes send their log records to the parent through log_queue instead of opening the log files,
+# so only the parent writes and rotates them. Handlers inherited through fork are removed.
+def setup_worker_logging(log_queue):
+    root_logger = logging.getLogger()
+    for handler in root_logger.handlers[:]:
+        root_logger.removeHandler(handler)
+    root_logger.setLevel(logging.DEBUG)
+    root_logger.addHandler(QueueHandler(log_queue))
+
+
+def init_pool_worker(log_queue, initializer, initargs):
+    setup_worker_logging(log_queue)
+    if initializer is not None:
+        initializer(*initargs)
+
+
+# Process pool whose workers log through the parent's handlers, then run initializer(*initargs)
+@contextmanager
+def worker_pool(max_workers, initializer=None, initargs=()):
+    log_queue = multiprocessing.Queue()
+    listener = QueueListener(log_queue, *logging.getLogger().handlers, respect_handler_level=True)
+    listener.start()
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=init_pool_worker,
+                                 initargs=(log_queue, initializer, initargs)) as executor:
+            yield executor
+    finally:
+        listener.stop()
+
+
 def init_db(database_url):
     engine = create_engine(database_url)
     Base.metadata.create_all(engine)
@@ -801,14 +863,73 @@ def init_db(database_url):
     return dg_session, rm_session
 
 
+# Index builds call the RMNOCASE collation for every comparison, so each side is lowered once and equal keys,
+# common in name indexes, return before the ordering tests.
 def rmnocase_collation(str1, str2):
-    return (str1.lower() > str2.lower()) - (str1.lower() < str2.lower())
+    key1 = str1.lower()
+    key2 = str2.lower()
+    if key1 == key2:
+        return 0
+    return -1 if key1 < key2 else 1
 
 
 def add_collation(dbapi_conn, _):
     dbapi_conn.create_collation("RMNOCASE", rmnocase_collation)
 
 
+# Connection settings for fast_import. journal_mode persists in the file, the others apply per connection.
+FAST_IMPORT_PRAGMAS = [
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=OFF",
+    "PRAGMA cache_size=-262144",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",
+]
+
+
+def add_fast_import_pragmas(dbapi_conn, _):
+    cursor = dbapi_conn.cursor()
+    for pragma in FAST_IMPORT_PRAGMAS:
+        cursor.execute(pragma)
+    cursor.close()
+
+
+# Checkpoint the WAL into the database and restore the default rollback journal once the import is done
+def restore_rm_pragmas(rm_db_path):
+    conn = connect_to_db(rm_db_path, "RootsMagic")
+    if conn is None:
+        return
+    try:
+        conn.execute("PRAGMA synchronous=FULL")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        journal_mode = conn.execute("PRAGMA journal_mode=DELETE").fetchone()[0]
+        logging.info(f"Restored RootsMagic database journal mode to {journal_mode}.")
+    except sqlite3.Error as s3_e:
+        logging.error(f"Error restoring RootsMagic database settings: {s3_e}")
+    finally:
+        conn.close()
+
+
+# pysqlite only emits BEGIN before DML and so breaks SAVEPOINT. The driver is taken out of transaction
+# handling and SQLAlchemy emits BEGIN itself, so the write phase can use a savepoint per stage.
+def disable_pysqlite_begin(dbapi_conn, _):
+    dbapi_conn.isolation_level = None
+
+
+def emit_begin(conn):
+    conn.exec_driver_sql("BEGIN")
+
+
+# Commit the write phase. Stages that completed are kept, a failed stage was already rolled back to its savepoint.
+def commit_write_phase(rm_session: Session):
+    try:
+        rm_session.commit()
+    except SQLAlchemyError as e:
+        logging.error(f"Error committing RootsMagic changes: {e}")
+        logging.error(traceback.format_exc())
+        rm_session.rollback()
+
+
 def find_database_paths():
     db_directory = ".\\db"
     dg_db_file = None
@@ -834,10 +955,7 @@ def connect_to_db(db_path, db_name=None):
     try:
         conn = sqlite3.connect(db_path)
         if db_name == "RootsMagic":
-            conn.create_collation(
-                "RMNOCASE",
-                lambda x, y: (x.lower() > y.lower()) - (x.lower() < y.lower()),
-            )
+            conn.create_collation("RMNOCASE", rmnocase_collation)
         logging.info(f"Connected to {db_name or 'database'} database at: {db_path}")
         return conn
     except sqlite3.Error as s3_e:
@@ -855,7 +973,12 @@ def connect_to_db_sqlalchemy(dg_db_path, rm_db_path):
         )
         rm_engine = create_engine(f"sqlite:///{rm_db_path}")
         listen(rm_engine, "connect", add_collation)
+        if fast_import:
+            listen(rm_engine, "connect", add_fast_import_pragmas)
+        listen(rm_engine, "connect", disable_pysqlite_begin)
+        listen(rm_engine, "begin", emit_begin)
         rm_bind = sessionmaker(bind=rm_engine)
+        listen(rm_bind, "after_rollback", reset_rm_indexes)
         rm_session = rm_bind()
         logging.info(
             f"Connected to RootsMagic database at: {rm_db_path} using SQLAlchemy"
@@ -957,62 +1080,348 @@ def prompt_user_for_kits(dna_kits):
     return selected_kits
 
 
-# Set a batch limit via the Limit global variable
-def batch_limit(session, table_class, filter_ids, process_func, apply_limit, batch_size=999):
-    processed_data = []
+# Load the selected Ids into a temporary table on the session's connection, returning the table.
+# filter_ids is either a list of Ids or a select of Ids, which SQLite runs once here instead of once per page.
+def load_temp_ids(session, table_class, filter_ids):
+    temp_ids = Table(f"temp_{table_class.__tablename__}_ids", MetaData(), Column('Id', Integer, primary_key=True),
+                     prefixes=['TEMPORARY'])
+    temp_ids.create(session.connection(), checkfirst=True)
+    session.execute(temp_ids.delete())
+    if isinstance(filter_ids, (list, tuple, set)):
+        if filter_ids:
+            session.execute(temp_ids.insert(), [{'Id': filter_id} for filter_id in set(filter_ids)])
+    else:
+        session.execute(temp_ids.insert().prefix_with('OR IGNORE').from_select(['Id'], filter_ids))
+    return temp_ids
+
+
+# Set a batch limit via the Limit global variable, yielding the processed records one batch at a time.
+# filter_ids is either a list of Ids or a select of Ids; rows are read with keyset pagination on Id.
+def stream_batch_limit(session, table_class, filter_ids, process_func, apply_limit, batch_size=999,
+                       prefetch_func=None):
     total_processed = 0
+    last_id = None
 
-    # Break down filter_ids into batches
-    for i in range(0, len(filter_ids), batch_size):
-        batch_ids = filter_ids[i:i + batch_size]
+    temp_ids = load_temp_ids(session, table_class, filter_ids)
 
-        query = session.query(table_class).filter(table_class.Id.in_(batch_ids))
+    while True:
+        page_size = batch_size
         if apply_limit > 0:
-            query = query.limit(apply_limit - total_processed)  # Adjust limit based on already processed data
+            page_size = min(batch_size, apply_limit - total_processed)  # Adjust limit based on already processed data
+
+        query = session.query(table_class).join(temp_ids, temp_ids.c.Id == table_class.Id)
+        if last_id is not None:
+            query = query.filter(table_class.Id > last_id)
+        limited_data = query.order_by(table_class.Id).limit(page_size).all()
+
+        if not limited_data:
+            break
 
-        limited_data = query.all()
+        # Load any related rows for the whole batch before processing it item by item
+        if prefetch_func:
+            prefetch_func(limited_data)
 
         # Process each item in the limited data using the provided process function
-        for item in limited_data:
-            processed_data.append(process_func(item))
+        yield [process_func(item) for item in limited_data]
 
         total_processed += len(limited_data)
+        last_id = limited_data[-1].Id
 
-        if 0 < apply_limit <= total_processed:
+        if 0 < apply_limit <= total_processed or len(limited_data) < page_size:
             break
 
-    return processed_data[:apply_limit] if apply_limit > 0 else processed_data
+
+UNIQUE_ID_NAMESPACE = uuid.NAMESPACE_DNS.bytes
 
 
-# Generate UUIDs
+# Generate UUIDs. This is uuid.uuid5(uuid.NAMESPACE_DNS, ...) formatted straight from the SHA-1 digest, without
+# building a UUID object for every record.
 def generate_unique_id(*args) -> str:
     filtered_args = [str(arg) for arg in args if arg]
     unique_str = ' '.join(filtered_args)
-    namespace = uuid.NAMESPACE_DNS
-    unique_id = str(uuid.uuid5(namespace, unique_str))
-    return unique_id
+    digest = bytearray(hashlib.sha1(UNIQUE_ID_NAMESPACE + unique_str.encode('utf-8')).digest()[:16])
+    digest[6] = (digest[6] & 0x0F) | 0x50  # Version 5
+    digest[8] = (digest[8] & 0x3F) | 0x80  # RFC 4122 variant
+    hex_digest = digest.hex()
+    return f"{hex_digest[:8]}-{hex_digest[8:12]}-{hex_digest[12:16]}-{hex_digest[16:20]}-{hex_digest[20:]}"
 
 
-# Generate a hashed version of PersonID, FatherID, and MotherID to fix DnaGedcom ID size
-def hash_id(original_id, id_mapping):
-    if original_id is None:
-        return None
-    if original_id in id_mapping:
-        return id_mapping[original_id]
-    hash_object = hashlib.md5(str(original_id).encode())
-    hash_hex = hash_object.hexdigest()
-    hash_int = int(hash_hex[:8], 16)
-    hashed_id = (hash_int % 9999999) + 100
-    id_mapping[original_id] = hashed_id
-    # logging.debug(f"Hashing ID: original_id={original_id}, hashed_id={hashed_id}")
-    return hashed_id
+# Day zero of RootsMagic UTCModDate values
+RM_EPOCH = datetime(1899, 12, 30, tzinfo=timezone.utc)
+
+
+# RootsMagic UTCModDate for the current time: days since 1899-12-30 UTC, the same value as
+# julianday('now') - 2415018.5. Computed once per batch and bound as a plain parameter.
+def rm_utc_mod_date():
+    return (datetime.now(timezone.utc) - RM_EPOCH).total_seconds() / 86400
+
+
+# Run-wide UniqueID -> PersonID index of the RootsMagic PersonTable, shared by every write stage.
+# It is loaded once, kept current by the PersonTable mapper events below and dropped when the RootsMagic
+# session rolls back.
+unique_id_index = None
+
+
+def load_unique_id_index(session: Session):
+    global unique_id_index
+    index = {}
+    for person_id, unique_id in (session.query(PersonTable.PersonID, PersonTable.UniqueID)
+                                 .filter(PersonTable.UniqueID.isnot(None))
+                                 .order_by(PersonTable.PersonID)):
+        index.setdefault(unique_id, person_id)
+    unique_id_index = index
+    logging.info(f"Loaded {len(unique_id_index)} UniqueIDs from PersonTable.")
+    return unique_id_index
+
+
+def get_person_id(session: Session, unique_id):
+    if unique_id_index is None:
+        load_unique_id_index(session)
+    return unique_id_index.get(unique_id)
+
+
+def index_inserted_person(_mapper, _connection, person):
+    if unique_id_index is not None and person.UniqueID:
+        unique_id_index.setdefault(person.UniqueID, person.PersonID)
+
+
+def index_updated_person(_mapper, _connection, person):
+    if unique_id_index is None:
+        return
+    for old_unique_id in inspect(person).attrs.UniqueID.history.deleted or ():
+        if unique_id_index.get(old_unique_id) == person.PersonID:
+            del unique_id_index[old_unique_id]
+    if person.UniqueID:
+        unique_id_index[person.UniqueID] = person.PersonID
+
+
+# Run-wide (OwnerID, NameType) -> NameID index of the RootsMagic NameTable, used by the bulk name writer.
+name_key_index = None
+
+
+def load_name_key_index(session: Session):
+    global name_key_index
+    index = {}
+    for name_id, owner_id, name_type in (session.query(NameTable.NameID, NameTable.OwnerID, NameTable.NameType)
+                                         .filter(NameTable.OwnerID.isnot(None))
+                                         .order_by(NameTable.NameID)):
+        index.setdefault((owner_id, name_type), name_id)
+    name_key_index = index
+    return name_key_index
+
+
+# Run-wide index of DNATable keyed on the canonical (min, max) person pair -> RecID, so a match is found
+# whichever way round ID1 and ID2 were stored.
+dna_pair_index = None
+
+
+def dna_pair_key(person_id_1, person_id_2):
+    return (person_id_1, person_id_2) if person_id_1 <= person_id_2 else (person_id_2, person_id_1)
+
+
+def load_dna_pair_index(session: Session):
+    global dna_pair_index
+    index = {}
+    for rec_id, person_id_1, person_id_2 in (session.query(DNATable.RecID, DNATable.ID1, DNATable.ID2)
+                                             .filter(DNATable.ID1.isnot(None), DNATable.ID2.isnot(None))
+                                             .order_by(DNATable.RecID)):
+        index.setdefault(dna_pair_key(person_id_1, person_id_2), rec_id)
+    dna_pair_index = index
+    return dna_pair_index
+
+
+# Run-wide PlaceTable name -> PlaceID cache. Names are folded the way the RMNOCASE collation compares them.
+place_name_index = None
+
+
+def load_place_name_index(session: Session):
+    global place_name_index
+    index = {}
+    for place_id, name in (session.query(PlaceTable.PlaceID, PlaceTable.Name)
+                           .filter(PlaceTable.Name.isnot(None))
+                           .order_by(PlaceTable.PlaceID)):
+        index.setdefault(name.lower(), place_id)
+    place_name_index = index
+    return place_name_index
+
+
+# Resolve a batch of place names to PlaceIDs, inserting every name PlaceTable does not have yet in one executemany.
+# A value that cannot be resolved is logged and left out of the returned index, so only the records using it fail.
+def resolve_place_ids(session: Session, place_names):
+    logger = logging.getLogger('resolve_place_ids')
+    place_table = PlaceTable.__table__
+    if place_name_index is None:
+        load_place_name_index(session)
+
+    used_place_ids = set()
+    new_places = {}
+    for place_name in place_names:
+        if place_name is None:
+            continue
+        try:
+            key = place_name.lower()
+        except Exception as e:
+            logger.error(f"Error resolving place {place_name!r}: {e}")
+            continue
+        place_id = place_name_index.get(key)
+        if place_id is not None:
+            used_place_ids.add(place_id)
+        else:
+            new_places.setdefault(key, place_name)
+
+    utc_mod_date = rm_utc_mod_date()
+
+    if used_place_ids:
+        session.execute(place_table.update()
+                        .where(place_table.c.PlaceID == bindparam('b_PlaceID'))
+                        .values(UTCModDate=utc_mod_date),
+                        [{'b_PlaceID': place_id} for place_id in used_place_ids])
+        expire_updated_rows(session, PlaceTable, used_place_ids)
+
+    if new_places:
+        next_place_id = session.query(func.max(PlaceTable.PlaceID)).scalar() or 0
+        place_rows = {}
+        for key, place_name in new_places.items():
+            next_place_id += 1
+            place_name_index[key] = next_place_id
+            place_rows[key] = {
+                'PlaceID': next_place_id,
+                'Name': place_name,
+                'PlaceType': 0,
+                'MasterID': 0,
+                'fsID': 0,
+                'anID': 0,
+                'Latitude': 0,
+                'Longitude': 0,
+                'LatLongExact': 0,
+            }
+        place_insert = place_table.insert().values(UTCModDate=utc_mod_date)
+        try:
+            with session.begin_nested():
+                session.execute(place_insert, list(place_rows.values()))
+        except Exception as e:
+            # Fall back to one savepoint per place so a bad name only drops itself
+            logger.error(f"Error inserting {len(place_rows)} places, retrying one at a time: {e}")
+            for key, place_row in place_rows.items():
+                try:
+                    with session.begin_nested():
+                        session.execute(place_insert, [place_row])
+                except Exception as row_e:
+                    logger.error(f"Error inserting place {place_row['Name']!r}: {row_e}")
+                    logger.error(traceback.format_exc())
+                    del place_name_index[key]
+
+    return place_name_index
+
+
+# Core bulk updates bypass the session, so expire any loaded objects for the rows they changed
+def expire_updated_rows(session: Session, model, primary_keys):
+    for primary_key in primary_keys:
+        instance = session.identity_map.get(session.identity_key(model, primary_key))
+        if instance is not None:
+            session.expire(instance)
+
+
+# Run-wide DNAGedcom source id -> PersonID map. It is persisted in RootMatchItIdMap, so a re-run gives every
+# source id the PersonID it got the first time.
+person_id_map = None
+
+# Source id keys of the processed records and the PersonID keys they resolve to
+PERSON_ID_FIELDS = [
+    ('person_source_id', 'PersonID'),
+    ('father_source_id', 'FatherID'),
+    ('mother_source_id', 'MotherID'),
+]
+
+
+def load_person_id_map(session: Session):
+    global person_id_map
+    RootMatchItIdMap.__table__.create(session.connection(), checkfirst=True)
+    person_id_map = dict(session.query(RootMatchItIdMap.SourceID, RootMatchItIdMap.PersonID))
+    logging.info(f"Loaded {len(person_id_map)} mapped source ids from RootMatchItIdMap.")
+    return person_id_map
+
+
+# Next PersonID not used by PersonTable nor handed out by the source id map
+def next_free_person_id(session: Session):
+    if person_id_map is None:
+        load_person_id_map(session)
+    max_person_id = session.query(func.max(PersonTable.PersonID)).scalar() or 0
+    max_mapped_id = session.query(func.max(RootMatchItIdMap.PersonID)).scalar() or 0
+    return max(max_person_id, max_mapped_id) + 1
+
+
+# Resolve the source ids of a batch of records to PersonIDs. Unseen source ids get dense new PersonIDs in record
+# order, recorded in RootMatchItIdMap with one executemany.
+def resolve_person_ids(session: Session, records):
+    if person_id_map is None:
+        load_person_id_map(session)
+
+    new_mappings = []
+    next_person_id = None
+    for data in records:
+        for source_key, id_key in PERSON_ID_FIELDS:
+            if source_key not in data:
+                continue
+            source_id = data[source_key]
+            if source_id is None:
+                data[id_key] = None
+                continue
+
+            source_id = str(source_id)
+            person_id = person_id_map.get(source_id)
+            if person_id is None:
+                if next_person_id is None:
+                    next_person_id = next_free_person_id(session)
+                person_id = person_id_map[source_id] = next_person_id
+                next_person_id += 1
+                new_mappings.append({'SourceID': source_id, 'PersonID': person_id})
+            data[id_key] = person_id
+
+    if new_mappings:
+        session.execute(RootMatchItIdMap.__table__.insert(), new_mappings)
+    return len(new_mappings)
+
+
+# PersonID -> FamilyID of parents whose family was written before their PersonTable row, as happens when a
+# streamed batch carries a family and a later batch its parents. SpouseID is set when the row is inserted.
+pending_spouse_links = {}
+
+
+# Set SpouseID on just-inserted persons that a family already named as father or mother
+def link_pending_spouses(session: Session, person_ids):
+    spouse_links = [{'b_PersonID': person_id, 'v_SpouseID': pending_spouse_links.pop(person_id)}
+                    for person_id in person_ids if person_id in pending_spouse_links]
+    if spouse_links:
+        person_table = PersonTable.__table__
+        session.execute(person_table.update()
+                        .where(person_table.c.PersonID == bindparam('b_PersonID'))
+                        .values(SpouseID=bindparam('v_SpouseID')),
+                        spouse_links)
+        expire_updated_rows(session, PersonTable, [link['b_PersonID'] for link in spouse_links])
+
+
+# Registered on the RootsMagic sessionmaker only, so a DNAGedcom rollback leaves the indexes alone
+def reset_rm_indexes(_session):
+    global unique_id_index, name_key_index, dna_pair_index, place_name_index, person_id_map
+    unique_id_index = None
+    name_key_index = None
+    dna_pair_index = None
+    place_name_index = None
+    person_id_map = None
+    pending_spouse_links.clear()
+
+
+listen(PersonTable, "after_insert", index_inserted_person)
+listen(PersonTable, "after_update", index_updated_person)
 
 
 # A check for duplicate records.
 def check_for_duplicates(session: Session, unique_id: str, **kwargs):
     logging.getLogger('get_or_create_person')
     try:
-        person = session.query(PersonTable).filter_by(UniqueID=unique_id).first()
+        person_id = get_person_id(session, unique_id)
+        person = session.get(PersonTable, person_id) if person_id is not None else None
         if person:
             for key, value in kwargs.items():
                 setattr(person, key, value)
@@ -1030,6 +1439,7 @@ def check_for_duplicates(session: Session, unique_id: str, **kwargs):
 
 
 # Filter results based on kits selected via select_kits function.
+# Each selected table maps to a lazy query of its Ids, so no rows are loaded until the processors page through them.
 def filter_selected_kits(filter_session: Session, f_selected_kits):
     global ancestry_matchgroups, ancestry_matchtrees, ancestry_treedata, ancestry_icw, \
         ancestry_ancestorcouple, ancestry_matchethnicity
@@ -1049,92 +1459,76 @@ def filter_selected_kits(filter_session: Session, f_selected_kits):
 
     try:
         # Ancestry filters
-        match_guids = []
+        match_guids = None
         if ancestry_matchgroups:
-            ancestry_matches = filter_session.query(Ancestry_matchGroups).filter(
-                Ancestry_matchGroups.testGuid.in_(selected_guids)).all()
-            test_ids['Ancestry_matchGroups'] = [match.Id for match in ancestry_matches]
+            test_ids['Ancestry_matchGroups'] = filter_session.query(Ancestry_matchGroups.Id).filter(
+                Ancestry_matchGroups.testGuid.in_(selected_guids))
 
             # Get matchGuids for use in other Ancestry tables
-            match_guids = [group.matchGuid for group in ancestry_matches]
+            match_guids = filter_session.query(Ancestry_matchGroups.matchGuid).filter(
+                Ancestry_matchGroups.testGuid.in_(selected_guids))
 
             if ancestry_matchtrees:
                 # Use both selected_guids and match_guids for ancestry_matchtrees
-                guids_to_check = selected_guids + match_guids
-                ancestry_matches_trees = filter_session.query(Ancestry_matchTrees).filter(
-                    Ancestry_matchTrees.matchid.in_(guids_to_check)).all()
-                test_ids['Ancestry_matchTrees'] = [match.Id for match in ancestry_matches_trees]
+                test_ids['Ancestry_matchTrees'] = filter_session.query(Ancestry_matchTrees.Id).filter(
+                    Ancestry_matchTrees.matchid.in_(selected_guids) | Ancestry_matchTrees.matchid.in_(match_guids))
 
         if ancestry_treedata:
-            ancestry_tree_data = filter_session.query(Ancestry_TreeData).filter(
-                Ancestry_TreeData.TestGuid.in_(selected_guids)).all()
-            test_ids['Ancestry_TreeData'] = [data.Id for data in ancestry_tree_data]
+            test_ids['Ancestry_TreeData'] = filter_session.query(Ancestry_TreeData.Id).filter(
+                Ancestry_TreeData.TestGuid.in_(selected_guids))
 
-        if ancestry_icw:
-            ancestry_icw_data = filter_session.query(Ancestry_ICW).filter(
-                Ancestry_ICW.matchid.in_(match_guids)).all()
-            test_ids['Ancestry_ICW'] = [icw.Id for icw in ancestry_icw_data]
+        if ancestry_icw and match_guids is not None:
+            test_ids['Ancestry_ICW'] = filter_session.query(Ancestry_ICW.Id).filter(
+                Ancestry_ICW.matchid.in_(match_guids))
 
         if ancestry_ancestorcouple:
-            ancestry_ancestor_couple = filter_session.query(AncestryAncestorCouple).filter(
-                AncestryAncestorCouple.TestGuid.in_(selected_guids)).all()
-            test_ids['AncestryAncestorCouple'] = [couple.Id for couple in ancestry_ancestor_couple]
+            test_ids['AncestryAncestorCouple'] = filter_session.query(AncestryAncestorCouple.Id).filter(
+                AncestryAncestorCouple.TestGuid.in_(selected_guids))
 
-        if ancestry_matchethnicity:
-            ancestry_match_ethnicity = filter_session.query(Ancestry_matchEthnicity).filter(
-                Ancestry_matchEthnicity.matchGuid.in_(match_guids)).all()
-            test_ids['Ancestry_matchEthnicity'] = [ethnicity.Id for ethnicity in ancestry_match_ethnicity]
+        if ancestry_matchethnicity and match_guids is not None:
+            test_ids['Ancestry_matchEthnicity'] = filter_session.query(Ancestry_matchEthnicity.Id).filter(
+                Ancestry_matchEthnicity.matchGuid.in_(match_guids))
 
         # FTDNA filters
         if ftdna_matches2:
-            ftdna_matches = filter_session.query(FTDNA_Matches2).filter(
-                FTDNA_Matches2.eKit1.in_(selected_guids)).all()
-            test_ids['FTDNA_Matches2'] = [match.Id for match in ftdna_matches]
+            test_ids['FTDNA_Matches2'] = filter_session.query(FTDNA_Matches2.Id).filter(
+                FTDNA_Matches2.eKit1.in_(selected_guids))
 
         if ftdna_chromo2:
-            ftdna_chromo = filter_session.query(FTDNA_Chromo2).filter(
-                FTDNA_Chromo2.eKit1.in_(selected_guids)).all()
-            test_ids['FTDNA_Chromo2'] = [chromo.Id for chromo in ftdna_chromo]
+            test_ids['FTDNA_Chromo2'] = filter_session.query(FTDNA_Chromo2.Id).filter(
+                FTDNA_Chromo2.eKit1.in_(selected_guids))
 
         if ftdna_icw2:
-            ftdna_icw = filter_session.query(FTDNA_ICW2).filter(
-                FTDNA_ICW2.eKitKit.in_(selected_guids)).all()
-            test_ids['FTDNA_ICW2'] = [icw.Id for icw in ftdna_icw]
+            test_ids['FTDNA_ICW2'] = filter_session.query(FTDNA_ICW2.Id).filter(
+                FTDNA_ICW2.eKitKit.in_(selected_guids))
 
         if dg_tree:
-            dg_trees = filter_session.query(DGTree).filter(
-                DGTree.matchID.in_(selected_guids)).all()
-            test_ids['DGTree'] = [tree.Id for tree in dg_trees]
+            test_ids['DGTree'] = filter_session.query(DGTree.Id).filter(
+                DGTree.matchID.in_(selected_guids))
 
         if dg_individual:
-            dg_individuals = filter_session.query(DGIndividual).filter(
-                DGIndividual.matchid.in_(selected_guids)).all()
-            test_ids['DGIndividual'] = [individual.Id for individual in dg_individuals]
+            test_ids['DGIndividual'] = filter_session.query(DGIndividual.Id).filter(
+                DGIndividual.matchid.in_(selected_guids))
 
         # MyHeritage filters
         if mh_match:
-            mh_matches = filter_session.query(MH_Match).filter(
-                MH_Match.guid.in_(selected_guids)).all()
-            test_ids['MH_Match'] = [match.Id for match in mh_matches]
+            test_ids['MH_Match'] = filter_session.query(MH_Match.Id).filter(
+                MH_Match.guid.in_(selected_guids))
 
         if mh_ancestors:
-            mh_ancestors_data = filter_session.query(MH_Ancestors).filter(
-                MH_Ancestors.matchid.in_(selected_guids)).all()
-            test_ids['MH_Ancestors'] = [ancestor.Id for ancestor in mh_ancestors_data]
+            test_ids['MH_Ancestors'] = filter_session.query(MH_Ancestors.Id).filter(
+                MH_Ancestors.matchid.in_(selected_guids))
 
         if mh_chromo:
-            mh_chromo_data = filter_session.query(MH_Chromo).filter(
-                MH_Chromo.guid.in_(selected_guids)).all()
-            test_ids['MH_Chromo'] = [chromo.Id for chromo in mh_chromo_data]
+            test_ids['MH_Chromo'] = filter_session.query(MH_Chromo.Id).filter(
+                MH_Chromo.guid.in_(selected_guids))
 
         if mh_icw:
-            mh_icw_data = filter_session.query(MH_ICW).filter(
-                MH_ICW.id1.in_(selected_guids)).all()
-            test_ids['MH_ICW'] = [icw.Id for icw in mh_icw_data]
+            test_ids['MH_ICW'] = filter_session.query(MH_ICW.Id).filter(
+                MH_ICW.id1.in_(selected_guids))
 
         if mh_tree:
-            mh_tree_data = filter_session.query(MH_Tree).all()
-            test_ids['MH_Tree'] = [tree.Id for tree in mh_tree_data]
+            test_ids['MH_Tree'] = filter_session.query(MH_Tree.Id)
 
     except Exception as filter_e:
         logging.error(f"Error filtering selected kits: {filter_e}")
@@ -1148,6 +1542,7 @@ def filter_selected_kits(filter_session: Session, f_selected_kits):
 def insert_fact_type(fact_rm_session: Session):
     logging.getLogger('insert_fact_type')
 
+    utc_mod_date = rm_utc_mod_date()
     try:
         # Check if Fact Type 'DNA Kit' already exists
         fact_type = fact_rm_session.query(FactTypeTable).filter_by(Name='DNA Kit').first()
@@ -1164,7 +1559,7 @@ def insert_fact_type(fact_rm_session: Session):
                 UsePlace=0,
                 Sentence='[person] had a DNA test performed. View DNA Tab in profile to view matches.',
                 Flags=2147483647,
-                UTCModDate=func.julianday(func.current_timestamp()) - 2415018.5,
+                UTCModDate=utc_mod_date,
             )
             fact_rm_session.add(new_fact_type)
             fact_rm_session.commit()
@@ -1179,7 +1574,7 @@ def insert_fact_type(fact_rm_session: Session):
             fact_type.UsePlace = 0
             fact_type.Sentence = '[person] had a DNA test performed. View DNA Tab in profile to view matches.'
             fact_type.Flags = 2147483647
-            fact_type.UTCModDate = func.julianday(func.current_timestamp()) - 2415018.5
+            fact_type.UTCModDate = utc_mod_date
             fact_rm_session.commit()
             # logging.info("Fact Type 'DNA Kit' updated in FactTypeTable.")
     except Exception as e:
@@ -1207,6 +1602,7 @@ def import_profiles(rm_session: Session, selected_kits):
             else:
                 print("Invalid input. Please enter M/Male, F/Female, or U/Unknown.")
 
+    utc_mod_date = rm_utc_mod_date()
     for kit_details in selected_kits:
         id_value, guid_value, name_given, name_surname = kit_details
 
@@ -1224,14 +1620,14 @@ def import_profiles(rm_session: Session, selected_kits):
                 # Update existing record with new gender value if needed
                 if person_record.Sex != gender_value:
                     person_record.Sex = gender_value
-                    person_record.UTCModDate = func.julianday(func.current_timestamp()) - 2415018.5
+                    person_record.UTCModDate = utc_mod_date
 
             else:
                 gender_value = get_gender_input(name_given, name_surname, guid_value)
                 person_record = PersonTable(
                     UniqueID=guid_value,
                     Color=1,
-                    UTCModDate=func.julianday(func.current_timestamp()) - 2415018.5,
+                    UTCModDate=utc_mod_date,
                     Sex=gender_value
                 )
                 rm_session.add(person_record)
@@ -1256,7 +1652,7 @@ def import_profiles(rm_session: Session, selected_kits):
                     IsPrimary=1,
                     IsPrivate=0,
                     Proof=0,
-                    UTCModDate=func.julianday(func.current_timestamp()) - 2415018.5,
+                    UTCModDate=utc_mod_date,
                     SortDate=int(9223372036854775807),
                     NameType=0,
                     GivenMP=name_given,
@@ -1279,55 +1675,89 @@ def import_profiles(rm_session: Session, selected_kits):
     # logging.info("Inserted or updated selected Profiles.")
 
 
-# Process Ancestry data
-def process_ancestry(session: Session, filtered_ids):
+# Every personId that appears as a father or mother in Ancestry_matchTrees, so sex inference is a set lookup
+def load_parent_role_ids(session: Session):
+    father_ids = {father_id for (father_id,) in session.query(Ancestry_matchTrees.fatherId).filter(
+        Ancestry_matchTrees.fatherId.isnot(None)).distinct()}
+    mother_ids = {mother_id for (mother_id,) in session.query(Ancestry_matchTrees.motherId).filter(
+        Ancestry_matchTrees.motherId.isnot(None)).distinct()}
+    return father_ids, mother_ids
+
+
+# Name and sex of an Ancestry match, as its match group record carries them
+def match_group_identity(group):
+    name = group.matchTestDisplayName
+    given, surname = (name.split()[0], name.split()[-1]) if len(name.split()) > 1 else (name, "")
+
+    subject_gender = group.subjectGender
+    sex = 1 if subject_gender == 'F' else 0 if subject_gender == 'M' else 2  # Default or unknown value
+
+    return {'Given': given, 'Surname': surname, 'sex': sex, 'NameType': 0}
+
+
+# Process Ancestry data, yielding the processed records one batch at a time.
+# chunk_context is set when a worker process transforms one chunk of a table (see load_chunk_context).
+def stream_ancestry(session: Session, filtered_ids, chunk_context=None):
     global limit
     logging.getLogger('process_ancestry')
     # logging.info("Processing Ancestry data...")
 
-    processed_ancestry_data = []
-    id_mapping = {}
+    # Name and sex of each match group by matchGuid, read again by the relid 1 match trees
+    match_groups_by_guid = {}
     try:
         # Process Ancestry_MatchGroups data
         if ancestry_matchgroups and filtered_ids.get('Ancestry_matchGroups'):
-            def process_matchgroup(mg_session, group):
-                # Query Ancestry_matchTrees using matchGuid
-                match_tree = mg_session.query(Ancestry_matchTrees).filter_by(matchid=group.matchGuid).first()
-
-                # create hashed ids for PersonID, FatherID, and MotherID
+            match_trees_by_matchid = {}
+
+            def prefetch_matchtrees(mg_session, groups):
+                # Load the ids of the first Ancestry_matchTrees row of every matchGuid in the batch with one query
+                match_trees_by_matchid.clear()
+                match_guids = [group.matchGuid for group in groups]
+                if not match_guids:
+                    return
+                first_tree_ids = (mg_session.query(func.min(Ancestry_matchTrees.Id))
+                                  .filter(Ancestry_matchTrees.matchid.in_(match_guids))
+                                  .group_by(Ancestry_matchTrees.matchid))
+                batch_trees = (mg_session.query(Ancestry_matchTrees.matchid, Ancestry_matchTrees.personId,
+                                                Ancestry_matchTrees.fatherId, Ancestry_matchTrees.motherId)
+                               .filter(Ancestry_matchTrees.Id.in_(first_tree_ids)))
+                for match_tree in batch_trees:
+                    match_trees_by_matchid[match_tree.matchid] = match_tree
+
+            def process_matchgroup(group):
+                match_tree = match_trees_by_matchid.get(group.matchGuid)
+
+                # Source ids for PersonID, FatherID, and MotherID, resolved to PersonIDs by the write phase
                 if match_tree and match_tree.personId is not None:
-                    person_id = hash_id(match_tree.personId, id_mapping)
-                    father_id = hash_id(match_tree.fatherId, id_mapping) if match_tree.fatherId is not None else None
-                    mother_id = hash_id(match_tree.motherId, id_mapping) if match_tree.motherId is not None else None
+                    person_id = match_tree.personId
+                    father_id = match_tree.fatherId
+                    mother_id = match_tree.motherId
                     color = 18
                 else:
-                    # If no match_tree is found, generate a default person_id using matchGuid and set color to 27
-                    person_id = hash_id(group.matchGuid, id_mapping)
+                    # If no match_tree is found, the matchGuid identifies the person and color is set to 27
+                    person_id = group.matchGuid
                     father_id = None
                     mother_id = None
                     color = 27
 
-                # Extract name and sex information
-                name = group.matchTestDisplayName
-                given, surname = (name.split()[0], name.split()[-1]) if len(name.split()) > 1 else (name, "")
-
-                subject_gender = group.subjectGender
-                sex = 1 if subject_gender == 'F' else 0 if subject_gender == 'M' else 2  # Default or unknown value
+                # Extract name and sex information, kept by matchGuid for the match trees' relid 1 persons
+                identity = match_group_identity(group)
+                match_groups_by_guid[group.matchGuid] = identity
 
                 return {
                     'source': 'process_matchgroup',
                     'DNAProvider': 2,
-                    'PersonID': person_id,
-                    'FatherID': father_id,
-                    'MotherID': mother_id,
+                    'person_source_id': person_id,
+                    'father_source_id': father_id,
+                    'mother_source_id': mother_id,
                     'unique_id': group.matchGuid,
                     'matchGuid': group.matchGuid,
                     'testGuid': group.testGuid,
-                    'sex': sex,
+                    'sex': identity['sex'],
                     'color': color,
                     'matchTestDisplayName': group.matchTestDisplayName,
-                    'Given': given,
-                    'Surname': surname,
+                    'Given': identity['Given'],
+                    'Surname': identity['Surname'],
                     'groupName': group.groupName,
                     'confidence': group.confidence,
                     'sharedCM': group.sharedCentimorgans,
@@ -1345,45 +1775,53 @@ def process_ancestry(session: Session, filtered_ids):
                     'meiosisValue': group.meiosisValue,
                     'parentCluster': group.parentCluster,
                     'IsPrimary': 1,
-                    'NameType': 0,
+                    'NameType': identity['NameType'],
                 }
 
-            match_groups = batch_limit(
+            yield from stream_batch_limit(
                 session, Ancestry_matchGroups, filtered_ids.get('Ancestry_matchGroups', []),
-                lambda group: process_matchgroup(session, group), limit
+                process_matchgroup, limit,
+                prefetch_func=lambda groups: prefetch_matchtrees(session, groups)
             )
 
-            id_mapping = {group['unique_id']: group for group in match_groups}
-            processed_ancestry_data.extend(match_groups or [])
-
         # Process Ancestry_MatchTrees data
         if ancestry_matchtrees and filtered_ids.get('Ancestry_matchTrees'):
+            if chunk_context is not None:
+                father_ids, mother_ids = chunk_context['father_ids'], chunk_context['mother_ids']
+            else:
+                father_ids, mother_ids = load_parent_role_ids(session)
+
+            def prefetch_matchgroups(mt_session, trees):
+                # A chunk worker has not streamed the match groups, so it loads the selected kits' groups of the
+                # batch's relid 1 trees with one query
+                match_guids = {tree.matchid for tree in trees if tree.relid == '1'}
+                if not match_guids:
+                    return
+                for group in (mt_session.query(Ancestry_matchGroups)
+                              .filter(Ancestry_matchGroups.matchGuid.in_(match_guids),
+                                      Ancestry_matchGroups.testGuid.in_(chunk_context['selected_guids']))
+                              .order_by(Ancestry_matchGroups.Id)):
+                    match_groups_by_guid[group.matchGuid] = match_group_identity(group)
+
             def process_matchtree(tree, person_data=None):
                 try:
                     data_source = person_data if person_data else tree
 
-                    # Get IDs
-                    person_id = hash_id(data_source.personId, id_mapping)
-                    father_id = hash_id(data_source.fatherId, id_mapping) if data_source.fatherId is not None else None
-                    mother_id = hash_id(data_source.motherId, id_mapping) if data_source.motherId is not None else None
+                    # Get source IDs
+                    person_id = data_source.personId
+                    father_id = data_source.fatherId
+                    mother_id = data_source.motherId
 
                     # Determine gender
                     sex_value = 2
                     if data_source.personId is not None:
-                        father_match = session.query(Ancestry_matchTrees).filter(
-                            Ancestry_matchTrees.fatherId == data_source.personId
-                        ).first()
-                        if father_match:
+                        if data_source.personId in father_ids:
                             sex_value = 0
-                        else:
-                            mother_match = session.query(Ancestry_matchTrees).filter(
-                                Ancestry_matchTrees.motherId == data_source.personId
-                            ).first()
-                            if mother_match:
-                                sex_value = 1
+                        elif data_source.personId in mother_ids:
+                            sex_value = 1
 
                     unique_id = tree.matchid
-                    match_group_data = id_mapping.get(unique_id, {})
+                    match_group_data = match_groups_by_guid.get(unique_id, {})
 
                     # Update name and gender based on match_group_data
                     if tree.relid == '1':
@@ -1393,8 +1831,8 @@ def process_ancestry(session: Session, filtered_ids):
                         sex_value = match_group_data.get('sex', sex_value)
 
                         # Ensure FatherID and MotherID are included
-                        father_id = hash_id(tree.fatherId, id_mapping) if tree.fatherId is not None else father_id
-                        mother_id = hash_id(tree.motherId, id_mapping) if tree.motherId is not None else mother_id
+                        father_id = tree.fatherId if tree.fatherId is not None else father_id
+                        mother_id = tree.motherId if tree.motherId is not None else mother_id
                     else:
                         unique_id = generate_unique_id(tree.given, tree.surname, tree.matchid, tree.relid)
                         surname = tree.surname
@@ -1414,9 +1852,9 @@ def process_ancestry(session: Session, filtered_ids):
                         'birthplace': tree.birthplace,
                         'deathplace': tree.deathplace,
                         'relid': tree.relid,
-                        'PersonID': person_id,
-                        'FatherID': father_id,
-                        'MotherID': mother_id,
+                        'person_source_id': person_id,
+                        'father_source_id': father_id,
+                        'mother_source_id': mother_id,
                         'DNAProvider': 2,
                         'Date': tree.created_date,
                         'IsPrimary': 1,
@@ -1429,13 +1867,12 @@ def process_ancestry(session: Session, filtered_ids):
 
             try:
                 # Process match trees with limit and process_matchtree function
-                match_trees = batch_limit(
+                yield from stream_batch_limit(
                     session, Ancestry_matchTrees, filtered_ids.get('Ancestry_matchTrees', []),
-                    process_matchtree, limit
+                    process_matchtree, limit,
+                    prefetch_func=(lambda trees: prefetch_matchgroups(session, trees))
+                    if chunk_context is not None and ancestry_matchgroups else None
                 )
-
-                # Extend processed ancestry data
-                processed_ancestry_data.extend(match_trees or [])
             except Exception as e:
                 logging.error(f"An error occurred while processing Ancestry match trees: {str(e)}")
                 logging.exception("Exception details:")
@@ -1462,12 +1899,10 @@ def process_ancestry(session: Session, filtered_ids):
 
             try:
                 # Process Ancestry tree data
-                tree_data = batch_limit(
+                yield from stream_batch_limit(
                     session, Ancestry_TreeData, filtered_ids.get('Ancestry_TreeData', []),
                     process_treedata, limit
                 )
-
-                processed_ancestry_data.extend(tree_data or [])
             except Exception as e:
                 logging.error(f"An error occurred while processing Ancestry tree data: {str(e)}")
                 logging.exception("Exception details:")
@@ -1490,12 +1925,10 @@ def process_ancestry(session: Session, filtered_ids):
 
             try:
                 # Process Ancestry ICW data
-                icw_data = batch_limit(
+                yield from stream_batch_limit(
                     session, Ancestry_ICW, filtered_ids.get('Ancestry_ICW', []),
                     process_icw, limit
                 )
-
-                processed_ancestry_data.extend(icw_data or [])
             except Exception as e:
                 logging.error(f"An error occurred while processing Ancestry ICW data: {str(e)}")
                 logging.exception("Exception details:")
@@ -1521,12 +1954,10 @@ def process_ancestry(session: Session, filtered_ids):
 
             try:
                 # Process Ancestry match ethnicity data
-                match_ethnicity_data = batch_limit(
+                yield from stream_batch_limit(
                     session, Ancestry_matchEthnicity, filtered_ids.get('Ancestry_matchEthnicity', []),
                     process_matchethnicity, limit
                 )
-
-                processed_ancestry_data.extend(match_ethnicity_data or [])
             except Exception as e:
                 logging.error(f"An error occurred while processing Ancestry match ethnicity data: {str(e)}")
                 logging.exception("Exception details:")
@@ -1579,12 +2010,10 @@ def process_ancestry(session: Session, filtered_ids):
 
             try:
                 # Process Ancestry ancestor couple data
-                ancestor_couple_data = batch_limit(
+                yield from stream_batch_limit(
                     session, AncestryAncestorCouple, filtered_ids.get('AncestryAncestorCouple', []),
                     process_ancestorcouple, limit
                 )
-
-                processed_ancestry_data.extend(ancestor_couple_data or [])
             except Exception as e:
                 logging.error(f"An error occurred while processing Ancestry ancestor couple data: {str(e)}")
                 logging.exception("Exception details:")
@@ -1593,17 +2022,18 @@ def process_ancestry(session: Session, filtered_ids):
         logging.error(f"An error occurred during processing Ancestry data: {str(e)}")
         logging.error(traceback.format_exc())
 
-    return processed_ancestry_data
+
+# Process Ancestry data
+def process_ancestry(session: Session, filtered_ids):
+    return [record for batch in stream_ancestry(session, filtered_ids) for record in batch]
 
 
-# Process FTDNA data
-def process_ftdna(session: Session, filtered_ids):
+# Process FTDNA data, yielding the processed records one batch at a time
+def stream_ftdna(session: Session, filtered_ids):
     global limit
     logging.getLogger('process_ftdna')
     # logging.info("Processing FTDNA data...")
 
-    processed_ftdna_data = []
-
     try:
         if ftdna_matches2 and filtered_ids.get('FTDNA_Matches2'):
             def process_ftdna_match(match):
@@ -1621,10 +2051,10 @@ def process_ftdna(session: Session, filtered_ids):
                     'mtHaplo': match.mtHaplo,
                 }
 
-            processed_ftdna_data.extend(batch_limit(
+            yield from stream_batch_limit(
                 session, FTDNA_Matches2, filtered_ids['FTDNA_Matches2'],
                 process_ftdna_match, limit
-            ))
+            )
 
         if ftdna_chromo2 and filtered_ids.get('FTDNA_Chromo2'):
             def process_ftdna_chromo(chromo):
@@ -1640,10 +2070,10 @@ def process_ftdna(session: Session, filtered_ids):
                     'snpsI': chromo.snpsI,
                 }
 
-            processed_ftdna_data.extend(batch_limit(
+            yield from stream_batch_limit(
                 session, FTDNA_Chromo2, filtered_ids['FTDNA_Chromo2'],
                 process_ftdna_chromo, limit
-            ))
+            )
 
         if ftdna_icw2 and filtered_ids.get('FTDNA_ICW2'):
             def process_ftdna_icw(icw):
@@ -1655,10 +2085,10 @@ def process_ftdna(session: Session, filtered_ids):
                     'eKitMatch2': icw.eKitMatch2,
                 }
 
-            processed_ftdna_data.extend(batch_limit(
+            yield from stream_batch_limit(
                 session, FTDNA_ICW2, filtered_ids['FTDNA_ICW2'],
                 process_ftdna_icw, limit
-            ))
+            )
 
         if dg_tree and filtered_ids.get('DGTree'):
             def process_dg_tree(tree):
@@ -1672,10 +2102,10 @@ def process_ftdna(session: Session, filtered_ids):
                     'matchID': tree.matchID,
                 }
 
-            processed_ftdna_data.extend(batch_limit(
+            yield from stream_batch_limit(
                 session, DGTree, filtered_ids['DGTree'],
                 process_dg_tree, limit
-            ))
+            )
 
         if dg_individual and filtered_ids.get('DGIndividual'):
             def process_dg_individual(individual):
@@ -1696,26 +2126,27 @@ def process_ftdna(session: Session, filtered_ids):
                     'motherId': individual.motherId,
                 }
 
-            processed_ftdna_data.extend(batch_limit(
+            yield from stream_batch_limit(
                 session, DGIndividual, filtered_ids['DGIndividual'],
                 process_dg_individual, limit
-            ))
+            )
 
     except Exception as e:
         logging.error(f"Error processing FTDNA data: {e}")
         logging.error(traceback.format_exc())
 
-    return processed_ftdna_data
+
+# Process FTDNA data
+def process_ftdna(session: Session, filtered_ids):
+    return [record for batch in stream_ftdna(session, filtered_ids) for record in batch]
 
 
-# Process MyHeritage data
-def process_mh(session: Session, filtered_ids):
+# Process MyHeritage data, yielding the processed records one batch at a time
+def stream_mh(session: Session, filtered_ids):
     global limit
     logging.getLogger('process_mh')
     # logging.info("Processing MyHeritage data...")
 
-    processed_mh_data = []
-
     try:
         if mh_match and filtered_ids.get('MH_Match'):
             def process_mh_match(match):
@@ -1736,10 +2167,10 @@ def process_mh(session: Session, filtered_ids):
                     'tree_url': match.tree_url,
                 }
 
-            processed_mh_data.extend(batch_limit(
+            yield from stream_batch_limit(
                 session, MH_Match, filtered_ids['MH_Match'],
                 process_mh_match, limit
-            ))
+            )
 
         if mh_ancestors and filtered_ids.get('MH_Ancestors'):
             def process_mh_ancestors(ancestor):
@@ -1760,10 +2191,10 @@ def process_mh(session: Session, filtered_ids):
                     'motherId': ancestor.motherId,
                 }
 
-            processed_mh_data.extend(batch_limit(
+            yield from stream_batch_limit(
                 session, MH_Ancestors, filtered_ids['MH_Ancestors'],
                 process_mh_ancestors, limit
-            ))
+            )
 
         if mh_chromo and filtered_ids.get('MH_Chromo'):
             def process_mh_chromo(chromo):
@@ -1780,10 +2211,10 @@ def process_mh(session: Session, filtered_ids):
                     'snps': chromo.snps,
                 }
 
-            processed_mh_data.extend(batch_limit(
+            yield from stream_batch_limit(
                 session, MH_Chromo, filtered_ids['MH_Chromo'],
                 process_mh_chromo, limit
-            ))
+            )
 
         if mh_icw and filtered_ids.get('MH_ICW'):
             def process_mh_icw(icw):
@@ -1799,10 +2230,10 @@ def process_mh(session: Session, filtered_ids):
                     'triSegments': icw.triSegments,
                 }
 
-            processed_mh_data.extend(batch_limit(
+            yield from stream_batch_limit(
                 session, MH_ICW, filtered_ids['MH_ICW'],
                 process_mh_icw, limit
-            ))
+            )
 
         if mh_tree and filtered_ids.get('MH_Tree'):
             def process_mh_tree(tree):
@@ -1814,20 +2245,306 @@ def process_mh(session: Session, filtered_ids):
                     'updated_date': tree.updated_date,
                 }
 
-            processed_mh_data.extend(batch_limit(
+            yield from stream_batch_limit(
                 session, MH_Tree, filtered_ids['MH_Tree'],
                 process_mh_tree, limit
-            ))
+            )
 
     except Exception as e:
         logging.error(f"Error processing MyHeritage data: {e}")
         logging.error(traceback.format_exc())
 
-    return processed_mh_data
+
+# Process MyHeritage data
+def process_mh(session: Session, filtered_ids):
+    return [record for batch in stream_mh(session, filtered_ids) for record in batch]
+
+
+# Stream all providers' processed records one batch at a time.
+def stream_processed_data(session: Session, filtered_ids, dg_db_path=None, selected_kits=None):
+    logging.info("Streaming Ancestry data...")
+    yield from stream_provider(session, 'ancestry', filtered_ids, dg_db_path, selected_kits)
+
+    logging.info("Streaming FTDNA data...")
+    yield from stream_provider(session, 'ftdna', filtered_ids, dg_db_path, selected_kits)
+
+    logging.info("Streaming MyHeritage data...")
+    yield from stream_provider(session, 'mh', filtered_ids, dg_db_path, selected_kits)
+
+
+# Provider transforms in the order their records are merged
+PROVIDER_TRANSFORMS = {
+    'ancestry': process_ancestry,
+    'ftdna': process_ftdna,
+    'mh': process_mh,
+}
+
+
+# Open a read-only DNAGedcom session, used by the transform worker processes
+def connect_to_dg_readonly(dg_db_path):
+    dg_engine = create_engine(f"sqlite:///{Path(dg_db_path).resolve().as_uri()}?mode=ro&uri=true")
+    dg_bind = sessionmaker(bind=dg_engine)
+    return dg_bind(), dg_engine
+
+
+# Worker process: run one provider's transform on its own DNAGedcom connection and return its records as plain dicts
+def run_provider_transform(provider, dg_db_path, selected_kits):
+    dg_session, dg_engine = connect_to_dg_readonly(dg_db_path)
+    try:
+        filtered_ids = filter_selected_kits(dg_session, selected_kits)
+        return PROVIDER_TRANSFORMS[provider](dg_session, filtered_ids)
+    finally:
+        dg_session.close()
+        dg_engine.dispose()
+
+
+# Run the provider transforms in one worker process each. Results are merged in PROVIDER_TRANSFORMS order,
+# whichever worker finishes first.
+def process_providers_parallel(dg_db_path, selected_kits, pbar=None):
+    processed_data = []
+    with worker_pool(len(PROVIDER_TRANSFORMS)) as executor:
+        futures = [executor.submit(run_provider_transform, provider, dg_db_path, selected_kits)
+                   for provider in PROVIDER_TRANSFORMS]
+        for provider, future in zip(PROVIDER_TRANSFORMS, futures):
+            provider_data = future.result()
+            logging.info(f"Processed {len(provider_data)} {provider} records.")
+            processed_data.extend(provider_data)
+            if pbar is not None:
+                pbar.update(1)
+    return processed_data
+
+
+# Provider stream functions and the tables they read, in the order they process them
+PROVIDER_STREAMS = {
+    'ancestry': stream_ancestry,
+    'ftdna': stream_ftdna,
+    'mh': stream_mh,
+}
+
+PROVIDER_TABLES = {
+    'ancestry': [Ancestry_matchGroups, Ancestry_matchTrees, Ancestry_TreeData, Ancestry_ICW, Ancestry_matchEthnicity,
+                 AncestryAncestorCouple],
+    'ftdna': [FTDNA_Matches2, FTDNA_Chromo2, FTDNA_ICW2, DGTree, DGIndividual],
+    'mh': [MH_Match, MH_Ancestors, MH_Chromo, MH_ICW, MH_Tree],
+}
+
+
+# Filtered rows per chunk task, the same as one serial stream batch
+TRANSFORM_CHUNK_SIZE = 999
+
+
+# Inputs a chunk worker would otherwise recompute from whole tables: the parent-role personIds of the Ancestry
+# match trees, and the selected kits whose match groups name the relid 1 trees. Loaded once per provider.
+def load_chunk_context(session: Session, provider, selected_kits):
+    if provider != 'ancestry' or not ancestry_matchtrees:
+        return None
+    father_ids, mother_ids = load_parent_role_ids(session)
+    return {
+        'father_ids': father_ids,
+        'mother_ids': mother_ids,
+        'selected_guids': [kit[1] for kit in selected_kits],
+    }
+
+
+# Chunk context of the provider a worker process transforms, set by its pool initializer
+worker_chunk_context = None
+
+
+def init_chunk_worker(chunk_context):
+    global worker_chunk_context
+    worker_chunk_context = chunk_context
+
+
+# Yield (table name, Ids) chunks of up to TRANSFORM_CHUNK_SIZE filtered Ids of each of a provider's tables.
+# Each table's filter is materialized once and paged in SQL, so only the current chunk's Ids are held.
+def plan_transform_chunks(session: Session, provider, filtered_ids):
+    for table_class in PROVIDER_TABLES[provider]:
+        filter_ids = filtered_ids.get(table_class.__tablename__)
+        if not filter_ids:
+            continue
+        temp_ids = load_temp_ids(session, table_class, filter_ids)
+        last_id = None
+        while True:
+            query = select(temp_ids.c.Id).order_by(temp_ids.c.Id).limit(TRANSFORM_CHUNK_SIZE)
+            if last_id is not None:
+                query = query.where(temp_ids.c.Id > last_id)
+            chunk_ids = session.execute(query).scalars().all()
+            if not chunk_ids:
+                break
+            yield table_class.__tablename__, chunk_ids
+            last_id = chunk_ids[-1]
+
+
+# Worker process: transform one chunk of a provider table on its own read-only DNAGedcom connection
+def run_transform_chunk(provider, table_name, chunk_ids, dg_db_path):
+    dg_session, dg_engine = connect_to_dg_readonly(dg_db_path)
+    try:
+        chunk_filtered_ids = {table_name: chunk_ids}
+        if provider == 'ancestry':
+            batches = stream_ancestry(dg_session, chunk_filtered_ids, worker_chunk_context)
+        else:
+            batches = PROVIDER_STREAMS[provider](dg_session, chunk_filtered_ids)
+        return [record for batch in batches for record in batch]
+    finally:
+        dg_session.close()
+        dg_engine.dispose()
+
+
+# Transform a provider's tables in transform_workers processes, one chunk per task. At most transform_workers + 1
+# chunks are in flight. Each chunk's records are yielded as one batch, in table and Id order, so the output
+# matches the serial stream.
+def stream_provider_chunked(session: Session, provider, filtered_ids, dg_db_path, selected_kits):
+    chunk_context = load_chunk_context(session, provider, selected_kits)
+    with worker_pool(transform_workers, init_chunk_worker, (chunk_context,)) as executor:
+        pending = deque()
+        for table_name, chunk_ids in plan_transform_chunks(session, provider, filtered_ids):
+            pending.append(executor.submit(run_transform_chunk, provider, table_name, chunk_ids, dg_db_path))
+            if len(pending) > transform_workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+# Stream a provider's records, through the chunked worker pool when transform_workers is set. The pool needs
+# every row transformed, so it is not used with limit. Provider workers call the stream functions directly.
+def stream_provider(session: Session, provider, filtered_ids, dg_db_path=None, selected_kits=None):
+    if transform_workers > 1 and limit == 0 and dg_db_path is not None:
+        yield from stream_provider_chunked(session, provider, filtered_ids, dg_db_path, selected_kits)
+    else:
+        yield from PROVIDER_STREAMS[provider](session, filtered_ids)
+
+
+# Collect a provider's processed records into one list
+def process_provider(session: Session, provider, filtered_ids, dg_db_path=None, selected_kits=None):
+    return [record for batch in stream_provider(session, provider, filtered_ids, dg_db_path, selected_kits)
+            for record in batch]
+
+
+# Write one batch of person records with set-based statements. Records are partitioned in memory into inserts
+# and updates, in the same order the per-record ORM path applied them, and sent with executemany.
+def write_person_batch(session: Session, records):
+    person_table = PersonTable.__table__
+    if unique_id_index is None:
+        load_unique_id_index(session)
+
+    record_ids = list({data['PersonID'] for data in records if data.get('PersonID') is not None})
+    existing_unique_ids = {}
+    for start in range(0, len(record_ids), 999):
+        existing_unique_ids.update(session.query(PersonTable.PersonID, PersonTable.UniqueID).filter(
+            PersonTable.PersonID.in_(record_ids[start:start + 999])))
+
+    new_rows = []
+    update_rows = []
+    rows_by_person_id = {}
+    rows_by_unique_id = {}
+
+    def current_keys(row):
+        values = row['values']
+        return values.get('PersonID', row.get('b_PersonID')), values.get('UniqueID', row.get('old_UniqueID'))
+
+    def existing_row(existing_person_id, existing_unique_id):
+        row = {'b_PersonID': existing_person_id, 'old_UniqueID': existing_unique_id, 'values': {}}
+        update_rows.append(row)
+        rows_by_person_id[existing_person_id] = row
+        if existing_unique_id:
+            rows_by_unique_id[existing_unique_id] = row
+        return row
+
+    for data in records:
+        person_id = data.get('PersonID')
+        relid = data.get('relid')
+        unique_id = data.get('unique_id')
+
+        person_data = {
+            'UniqueID': unique_id,
+            'Sex': data.get('sex', ''),
+            'Color': data.get('color', ''),
+        }
+
+        if person_id is not None:
+            person_data['PersonID'] = person_id
+
+        # Look up by PersonID first, then by UniqueID, among this batch's rows and then the database
+        row = None
+        if person_id is not None:
+            row = rows_by_person_id.get(person_id)
+            if row is None and person_id in existing_unique_ids:
+                row = existing_row(person_id, existing_unique_ids.pop(person_id))
+        if row is None and unique_id:
+            row = rows_by_unique_id.get(unique_id)
+            if row is None:
+                existing_person_id = unique_id_index.get(unique_id)
+                if existing_person_id is not None and existing_person_id not in rows_by_person_id:
+                    existing_unique_ids.pop(existing_person_id, None)
+                    row = existing_row(existing_person_id, unique_id)
+
+        if row is None:
+            row = {'values': person_data}
+            new_rows.append(row)
+        elif relid != '1':
+            old_person_id, old_unique_id = current_keys(row)
+            row['values'].update(person_data)
+            new_person_id, new_unique_id = current_keys(row)
+            if new_person_id != old_person_id and rows_by_person_id.get(old_person_id) is row:
+                del rows_by_person_id[old_person_id]
+            if new_unique_id != old_unique_id and rows_by_unique_id.get(old_unique_id) is row:
+                del rows_by_unique_id[old_unique_id]
+        # relid '1' on an existing person only refreshes UTCModDate, which every statement sets
+
+        new_person_id, new_unique_id = current_keys(row)
+        if new_person_id is not None:
+            rows_by_person_id[new_person_id] = row
+        if new_unique_id:
+            rows_by_unique_id.setdefault(new_unique_id, row)
+
+    utc_mod_date = rm_utc_mod_date()
+
+    # Updates first, as the ORM unit of work does, grouped by the set of columns they change
+    update_groups = {}
+    for row in update_rows:
+        values = dict(row['values'])
+        if values:
+            values.setdefault('PersonID', row['b_PersonID'])
+        update_groups.setdefault(tuple(sorted(values)), []).append(
+            {'b_PersonID': row['b_PersonID'], **{f"v_{key}": value for key, value in values.items()}})
+    for columns, params in update_groups.items():
+        statement = (person_table.update()
+                     .where(person_table.c.PersonID == bindparam('b_PersonID'))
+                     .values(UTCModDate=utc_mod_date, **{column: bindparam(f"v_{column}") for column in columns}))
+        session.execute(statement, params)
+    expire_updated_rows(session, PersonTable, [row['b_PersonID'] for row in update_rows])
+
+    # Persons without a PersonID get the next free PersonID, past the ids reserved by the source id map and
+    # every explicit PersonID in the batch, wherever it falls in record order
+    explicit_person_ids = [row['values']['PersonID'] for row in new_rows if row['values'].get('PersonID') is not None]
+    next_person_id = max([next_free_person_id(session)] + [person_id + 1 for person_id in explicit_person_ids]) - 1
+    insert_params = []
+    for row in new_rows:
+        values = row['values']
+        if values.get('PersonID') is None:
+            next_person_id += 1
+            values['PersonID'] = next_person_id
+        insert_params.append(values)
+    if insert_params:
+        session.execute(person_table.insert().values(UTCModDate=utc_mod_date), insert_params)
+        link_pending_spouses(session, [values['PersonID'] for values in insert_params])
+
+    # Keep the UniqueID index in step with what was just written
+    for row in update_rows:
+        person_id, unique_id = current_keys(row)
+        if row['old_UniqueID'] != unique_id and unique_id_index.get(row['old_UniqueID']) == row['b_PersonID']:
+            del unique_id_index[row['old_UniqueID']]
+        if unique_id:
+            unique_id_index[unique_id] = person_id
+    for values in insert_params:
+        if values['UniqueID']:
+            unique_id_index.setdefault(values['UniqueID'], values['PersonID'])
+
+    return len(records)
 
 
 # Import data into RootsMagic PersonTable.
-def insert_person(person_rm_session: Session, processed_data, batch_size=limit):
+def insert_person(person_rm_session: Session, processed_data, batch_size=bulk_batch_size):
     logging.getLogger('insert_person')
     # logging.info("Inserting or updating individuals in PersonTable...")
 
@@ -1839,73 +2556,83 @@ def insert_person(person_rm_session: Session, processed_data, batch_size=limit):
     try:
         processed_count = 0
         blank_record_count = 0
+        records = []
         for data in processed_data:
-            if data.get('source') == 'process_icw':
-                continue
-
             person_id = data.get('PersonID')
             relid = data.get('relid')
             unique_id = data.get('unique_id')
             sex_value = data.get('sex', '')
 
-            # logging.debug(f"Processing record: PersonID: {person_id}, "
-            #               f"UniqueID: {unique_id}, sex: {sex_value}, relid: {relid}")
-
             if person_id is None and not unique_id:
                 blank_record_count += 1
                 logging.warning(f"Potentially problematic record: PersonID: None, "
                                 f"UniqueID: None, sex: {sex_value}, relid: {relid}")
                 continue  # Skip processing if both PersonID and UniqueID are missing
 
-            person_data = {
-                'UniqueID': unique_id,
-                'Sex': sex_value,
-                'Color': data.get('color', ''),
-                'UTCModDate': func.julianday(func.current_timestamp()) - 2415018.5,
-            }
-
-            if person_id is not None:
-                person_data['PersonID'] = person_id
-
-            existing_person = None
-            if person_id is not None:
-                existing_person = person_rm_session.query(PersonTable).filter_by(PersonID=person_id).first()
-            if not existing_person and unique_id:
-                existing_person = person_rm_session.query(PersonTable).filter_by(UniqueID=unique_id).first()
+            records.append(data)
+            if batch_size > 0 and len(records) >= batch_size:
+                processed_count += write_person_batch(person_rm_session, records)
+                records = []
 
-            if existing_person:
-                if relid != '1':
-                    for key, value in person_data.items():
-                        setattr(existing_person, key, value)
-                    # logging.debug(f"Updated existing record: PersonID: {person_id}, UniqueID: {unique_id}")
-                else:
-                    setattr(existing_person, 'UTCModDate', person_data['UTCModDate'])
-                    # logging.debug(f"Updated existing record (relid=1): PersonID: {person_id}, UniqueID: {unique_id}")
-            else:
-                new_person = PersonTable(**person_data)
-                person_rm_session.add(new_person)
-                # logging.debug(f"Inserted new record: PersonID: {person_id}, UniqueID: {unique_id}")
-
-            processed_count += 1
-            if batch_size > 0 and processed_count % batch_size == 0:
-                person_rm_session.flush()
+        if records:
+            processed_count += write_person_batch(person_rm_session, records)
 
-        person_rm_session.commit()
         logging.info(f"Processed {processed_count} person records. {blank_record_count} "
                      f"records had neither PersonID nor UniqueID.")
 
     except Exception as e:
         logging.error(f"Error inserting or updating PersonTable: {e}")
         logging.error(traceback.format_exc())
-        person_rm_session.rollback()
         raise
 
-    finally:
-        person_rm_session.close()
+
+# Write one batch of name rows keyed on (OwnerID, NameType): existing names are updated and new ones inserted,
+# each with a single executemany.
+def write_name_batch(session: Session, name_rows):
+    name_table = NameTable.__table__
+    if name_key_index is None:
+        load_name_key_index(session)
+
+    new_rows = []
+    new_rows_by_key = {}
+    updates = {}
+    for name_data in name_rows:
+        key = (name_data['OwnerID'], name_data['NameType'])
+        if name_data['OwnerID'] is None:
+            new_rows.append(name_data)
+        elif key in new_rows_by_key:
+            new_rows_by_key[key].update(name_data)
+        elif key in name_key_index:
+            updates[name_key_index[key]] = name_data
+        else:
+            new_rows_by_key[key] = name_data
+            new_rows.append(name_data)
+
+    utc_mod_date = rm_utc_mod_date()
+
+    if updates:
+        columns = list(name_rows[0])
+        statement = (name_table.update()
+                     .where(name_table.c.NameID == bindparam('b_NameID'))
+                     .values(UTCModDate=utc_mod_date, **{column: bindparam(f"v_{column}") for column in columns}))
+        session.execute(statement, [{'b_NameID': name_id, **{f"v_{column}": name_data[column] for column in columns}}
+                                    for name_id, name_data in updates.items()])
+        expire_updated_rows(session, NameTable, updates)
+
+    if new_rows:
+        next_name_id = session.query(func.max(NameTable.NameID)).scalar() or 0
+        for name_data in new_rows:
+            next_name_id += 1
+            name_data['NameID'] = next_name_id
+            if name_data['OwnerID'] is not None:
+                name_key_index[(name_data['OwnerID'], name_data['NameType'])] = next_name_id
+        session.execute(name_table.insert().values(UTCModDate=utc_mod_date), new_rows)
+
+    return len(name_rows)
 
 
 # Import data into RootsMagic NameTable.
-def insert_name(name_rm_session: Session, processed_data, batch_size=limit):
+def insert_name(name_rm_session: Session, processed_data, batch_size=bulk_batch_size):
     logging.getLogger('insert_name')
     # logging.info("Inserting or updating names in NameTable...")
 
@@ -1916,9 +2643,8 @@ def insert_name(name_rm_session: Session, processed_data, batch_size=limit):
 
     try:
         processed_count = 0
+        name_rows = []
         for data in processed_data:
-            if data.get('source') == 'process_icw':
-                continue
             # Get PersonID from processed_data
             person_id = data.get('PersonID') or data.get('personId')
 
@@ -1926,16 +2652,14 @@ def insert_name(name_rm_session: Session, processed_data, batch_size=limit):
             if person_id is None:
                 unique_id = data.get('unique_id')
                 if unique_id:
-                    person_record = name_rm_session.query(PersonTable).filter_by(UniqueID=unique_id).first()
-                    if person_record:
-                        person_id = person_record.PersonID
-                    else:
+                    person_id = get_person_id(name_rm_session, unique_id)
+                    if person_id is None:
                         logging.warning(f"No matching PersonID found for UniqueID: {unique_id}")
                 else:
                     logging.warning("No PersonID or UniqueID available for this record")
 
-            # Map processed_data to NameTable columns
-            name_data = {
+            # Map processed_data to NameTable columns, filling SurnameMP and GivenMP in the same pass
+            name_rows.append({
                 'OwnerID': person_id,
                 'Surname': data.get('Surname', ''),
                 'Given': data.get('Given', ''),
@@ -1946,55 +2670,34 @@ def insert_name(name_rm_session: Session, processed_data, batch_size=limit):
                 'Proof': 0,
                 'SurnameMP': data.get('Surname', ''),
                 'GivenMP': data.get('Given', ''),
-                'UTCModDate': func.julianday(func.current_timestamp()) - 2415018.5,
-            }
-
-            # Check if a name record already exists for this person and name type
-            existing_name = None
-            if person_id is not None:
-                existing_name = name_rm_session.query(NameTable).filter_by(OwnerID=person_id).first()
+            })
 
-            if existing_name:
-                # Update existing record
-                for key, value in name_data.items():
-                    setattr(existing_name, key, value)
-                # logging.debug(f"Updated name record for OwnerID: {person_id} {name_data}")
-            else:
-                # Create new record
-                new_name = NameTable(**name_data)
-                name_rm_session.add(new_name)
-                # logging.debug(f"Inserted new name record for OwnerID: {person_id} {name_data}")
+            if batch_size > 0 and len(name_rows) >= batch_size:
+                processed_count += write_name_batch(name_rm_session, name_rows)
+                name_rows = []
 
-            processed_count += 1
-            if batch_size > 0 and processed_count % batch_size == 0:
-                name_rm_session.flush()
+        if name_rows:
+            processed_count += write_name_batch(name_rm_session, name_rows)
 
-        name_rm_session.commit()
         logging.info(f"Processed {processed_count} name records.")
 
     except Exception as e:
         logging.error(f"Error inserting or updating NameTable: {e}")
         logging.error(traceback.format_exc())
-        name_rm_session.rollback()
         raise
 
-    finally:
-        name_rm_session.close()
-
 
 # Import data into RootsMagic FamilyTable
 def insert_family(family_rm_session: Session, processed_data, batch_size=limit):
     logging.getLogger('insert_family')
     # logging.info("Inserting or updating family data in FamilyTable...")
 
+    utc_mod_date = rm_utc_mod_date()
     try:
         processed_count = 0
 
         for data in processed_data:
 
-            if data.get('source') == 'process_icw':
-                continue
-
             family_id = data.get('FamilyID')
             father_id = data.get('FatherID')
             mother_id = data.get('MotherID')
@@ -2002,7 +2705,7 @@ def insert_family(family_rm_session: Session, processed_data, batch_size=limit):
 
             # If FamilyID is provided, look for an existing record with that FamilyID
             if family_id:
-                existing_family = family_rm_session.query(FamilyTable).filter_by(FamilyID=family_id).first()
+                existing_family = family_rm_session.get(FamilyTable, family_id)
             else:
                 # If no FamilyID, look for an existing record with matching FatherID, MotherID, and ChildID
                 existing_family = family_rm_session.query(FamilyTable).filter(
@@ -2016,7 +2719,7 @@ def insert_family(family_rm_session: Session, processed_data, batch_size=limit):
                 for key, value in data.items():
                     if key in FamilyTable.__table__.columns and value is not None:
                         setattr(existing_family, key, value)
-                existing_family.UTCModDate = func.julianday(func.current_timestamp()) - 2415018.5
+                existing_family.UTCModDate = utc_mod_date
                 data['FamilyID'] = existing_family.FamilyID  # Update FamilyID in data
             else:
                 # Create new record in FamilyTable
@@ -2024,7 +2727,7 @@ def insert_family(family_rm_session: Session, processed_data, batch_size=limit):
                     'FatherID': father_id,
                     'MotherID': mother_id,
                     'ChildID': child_id,
-                    'UTCModDate': func.julianday(func.current_timestamp()) - 2415018.5,
+                    'UTCModDate': utc_mod_date,
                 }
                 new_family = FamilyTable(**family_data)
                 family_rm_session.add(new_family)
@@ -2034,28 +2737,34 @@ def insert_family(family_rm_session: Session, processed_data, batch_size=limit):
                 data['FamilyID'] = new_family.FamilyID
 
             # Update PersonTable with FamilyID as ParentID and SpouseID
+            # A parent without a row yet is linked when its row is inserted (see pending_spouse_links)
             if father_id:
-                father = family_rm_session.query(PersonTable).filter_by(PersonID=father_id).first()
+                father = family_rm_session.get(PersonTable, father_id)
                 if father:
                     father.SpouseID = data['FamilyID']
-                    father.UTCModDate = func.julianday(func.current_timestamp()) - 2415018.5
+                    father.UTCModDate = utc_mod_date
+                else:
+                    pending_spouse_links[father_id] = data['FamilyID']
 
             if mother_id:
-                mother = family_rm_session.query(PersonTable).filter_by(PersonID=mother_id).first()
+                mother = family_rm_session.get(PersonTable, mother_id)
                 if mother:
                     mother.SpouseID = data['FamilyID']
-                    mother.UTCModDate = func.julianday(func.current_timestamp()) - 2415018.5
+                    mother.UTCModDate = utc_mod_date
+                else:
+                    pending_spouse_links[mother_id] = data['FamilyID']
 
-            child = family_rm_session.query(PersonTable).filter_by(PersonID=child_id).first()
+            child = family_rm_session.get(PersonTable, child_id)
             if child:
                 child.ParentID = data['FamilyID']
-                child.UTCModDate = func.julianday(func.current_timestamp()) - 2415018.5
+                child.UTCModDate = utc_mod_date
             else:
                 # If no existing person, create new person record
                 new_person = PersonTable(
                     PersonID=child_id,
                     ParentID=data['FamilyID'],
-                    UTCModDate=func.julianday(func.current_timestamp()) - 2415018.5
+                    SpouseID=pending_spouse_links.pop(child_id, None),
+                    UTCModDate=utc_mod_date
                 )
                 family_rm_session.add(new_person)
 
@@ -2063,32 +2772,25 @@ def insert_family(family_rm_session: Session, processed_data, batch_size=limit):
             if batch_size > 0 and processed_count % batch_size == 0:
                 family_rm_session.flush()
 
-        family_rm_session.commit()
         logging.info(f"Processed {processed_count} family records.")
         return processed_data
 
     except Exception as e:
         logging.error(f"Error inserting or updating FamilyTable: {e}")
         logging.error(traceback.format_exc())
-        family_rm_session.rollback()
         raise
 
-    finally:
-        family_rm_session.close()
-
 
 # Import data into RootsMagic ChildTable
 def insert_child(child_rm_session: Session, processed_data, batch_size=limit):
     logging.getLogger('insert_child')
     # logging.info("Inserting or updating children in ChildTable...")
 
+    utc_mod_date = rm_utc_mod_date()
     try:
         processed_count = 0
 
         for data in processed_data:
-            if data.get('source') == 'process_icw':
-                continue
-
             child_id = data.get('PersonID')
             family_id = data.get('FamilyID')
 
@@ -2107,7 +2809,7 @@ def insert_child(child_rm_session: Session, processed_data, batch_size=limit):
                 for key, value in data.items():
                     if key in ChildTable.__table__.columns and value is not None:
                         setattr(existing_child, key, value)
-                existing_child.UTCModDate = func.julianday(func.current_timestamp()) - 2415018.5
+                existing_child.UTCModDate = utc_mod_date
                 # logging.debug(
                 #     f"Updated existing child record for ChildID: {child_id} and FamilyID: {family_id}")
             else:
@@ -2115,7 +2817,7 @@ def insert_child(child_rm_session: Session, processed_data, batch_size=limit):
                 child_data = {
                     'ChildID': child_id,
                     'FamilyID': family_id,
-                    'UTCModDate': func.julianday(func.current_timestamp()) - 2415018.5,
+                    'UTCModDate': utc_mod_date,
                 }
                 new_child = ChildTable(**child_data)
                 child_rm_session.add(new_child)
@@ -2125,310 +2827,339 @@ def insert_child(child_rm_session: Session, processed_data, batch_size=limit):
             if batch_size > 0 and processed_count % batch_size == 0:
                 child_rm_session.flush()
 
-        child_rm_session.commit()
         logging.info(f"Processed {processed_count} child records.")
 
     except Exception as e:
         logging.error(f"Error inserting or updating ChildTable: {e}")
         logging.error(traceback.format_exc())
-        child_rm_session.rollback()
         raise
-    finally:
-        child_rm_session.close()
+
+
+# Write one batch of DNA rows: pairs already in DNATable are updated and new pairs inserted, each with a single
+# executemany.
+def write_dna_batch(session: Session, dna_rows):
+    dna_table = DNATable.__table__
+    if dna_pair_index is None:
+        load_dna_pair_index(session)
+
+    new_rows = {}
+    updates = {}
+    for dna_data in dna_rows:
+        key = dna_pair_key(dna_data['ID1'], dna_data['ID2'])
+        if key in new_rows:
+            new_rows[key].update(dna_data)
+        elif key in dna_pair_index:
+            updates[dna_pair_index[key]] = dna_data
+        else:
+            new_rows[key] = dna_data
+
+    utc_mod_date = rm_utc_mod_date()
+
+    if updates:
+        columns = list(dna_rows[0])
+        statement = (dna_table.update()
+                     .where(dna_table.c.RecID == bindparam('b_RecID'))
+                     .values(UTCModDate=utc_mod_date, **{column: bindparam(f"v_{column}") for column in columns}))
+        session.execute(statement, [{'b_RecID': rec_id, **{f"v_{column}": dna_data[column] for column in columns}}
+                                    for rec_id, dna_data in updates.items()])
+        expire_updated_rows(session, DNATable, updates)
+
+    if new_rows:
+        next_rec_id = session.query(func.max(DNATable.RecID)).scalar() or 0
+        for key, dna_data in new_rows.items():
+            next_rec_id += 1
+            dna_data['RecID'] = next_rec_id
+            dna_pair_index[key] = next_rec_id
+        session.execute(dna_table.insert().values(UTCModDate=utc_mod_date), list(new_rows.values()))
+
+    return len(dna_rows)
 
 
 # Import data into RootsMagic DNATable
-def insert_dna(dna_rm_session: Session, processed_data, selected_kits, batch_size=limit):
+def insert_dna(dna_rm_session: Session, processed_data, selected_kits, batch_size=bulk_batch_size):
     logging.getLogger('insert_dna')
     # logging.info("Inserting or updating DNA data in DNATable...")
 
     try:
         processed_count = 0
+        dna_rows = []
 
-        for kit in selected_kits:
-            selected_kit_guid = kit[1]
-            #  logging.info(f"Processing data for kit GUID: {selected_kit_guid}")
-
-            for data in processed_data:
-                if 'source' in data and data['source'] == 'process_matchgroup':
-                    person_1 = dna_rm_session.query(PersonTable).filter_by(UniqueID=selected_kit_guid).first()
-                    person_id_1 = person_1.PersonID if person_1 else None
-
-                    person_id_2 = data.get('PersonID')
+        # Resolve each selected kit's person once; a match record belongs to the kit named by its testGuid
+        kit_person_ids = {kit[1]: get_person_id(dna_rm_session, kit[1]) for kit in selected_kits}
 
-                    label1 = data['testGuid']
-                    label2 = data['matchGuid']
-                    note = (f"https://www.ancestry.com/discoveryui-matches/compare/"
-                            f"{data['testGuid']}/with/{data.get('matchGuid')}")
+        for data in processed_data:
+            if data.get('source') == 'process_matchgroup':
+                person_id_1 = kit_person_ids.get(data['testGuid'])
 
-                elif data['source'] == 'process_icw':
-                    match_guid = data['matchGuid']
-                    icw_guid = data['icwGuid']
+                person_id_2 = data.get('PersonID')
 
-                    person_1 = dna_rm_session.query(PersonTable).filter_by(UniqueID=match_guid).first()
-                    person_id_1 = person_1.PersonID if person_1 else None
+                label1 = data['testGuid']
+                label2 = data['matchGuid']
+                note = (f"https://www.ancestry.com/discoveryui-matches/compare/"
+                        f"{data['testGuid']}/with/{data.get('matchGuid')}")
 
-                    person_2 = dna_rm_session.query(PersonTable).filter_by(UniqueID=icw_guid).first()
-                    person_id_2 = person_2.PersonID if person_2 else None
+            elif data.get('source') == 'process_icw':
+                match_guid = data['matchGuid']
+                icw_guid = data['icwGuid']
 
-                    label1 = match_guid
-                    label2 = icw_guid
-                    note = (f"https://www.ancestry.com/discoveryui-matches/compare/"
-                            f"{data['matchGuid']}/with/{data.get('icwGuid')}")
+                person_id_1 = get_person_id(dna_rm_session, match_guid)
+                person_id_2 = get_person_id(dna_rm_session, icw_guid)
 
-                else:
-                    continue
+                label1 = match_guid
+                label2 = icw_guid
+                note = (f"https://www.ancestry.com/discoveryui-matches/compare/"
+                        f"{data['matchGuid']}/with/{data.get('icwGuid')}")
 
-                if not person_id_1 or not person_id_2:
-                    continue
-
-                shared_cm = data.get('sharedCM')
-                date = data.get('Date') or data.get('matchRunDate')
-
-                dna_data = {
-                    'ID1': person_id_1,
-                    'ID2': person_id_2,
-                    'Label1': label1,
-                    'Label2': label2,
-                    'DNAProvider': data.get('DNAProvider'),
-                    'SharedCM': shared_cm,
-                    'SharedPercent': round(shared_cm / 69, 2) if shared_cm else None,
-                    'SharedSegs': data.get('SharedSegs'),
-                    'Date': date,
-                    'Note': note,
-                    'UTCModDate': func.julianday(func.current_timestamp()) - 2415018.5,
-                }
-
-                existing_dna = (dna_rm_session.query(DNATable)
-                                .filter(((DNATable.ID1 == person_id_1) & (DNATable.ID2 == person_id_2)) |
-                                        ((DNATable.ID1 == person_id_2) & (DNATable.ID2 == person_id_1)))
-                                .first())
+            else:
+                continue
 
-                if existing_dna:
-                    for key, value in dna_data.items():
-                        setattr(existing_dna, key, value)
-                    existing_dna.UTCModDate = func.julianday(func.current_timestamp()) - 2415018.5
-                else:
-                    new_dna = DNATable(**dna_data)
-                    dna_rm_session.add(new_dna)
+            if not person_id_1 or not person_id_2:
+                continue
 
-                processed_count += 1
-                if batch_size > 0 and processed_count % batch_size == 0:
-                    dna_rm_session.flush()
+            shared_cm = data.get('sharedCM')
+            date = data.get('Date') or data.get('matchRunDate')
+
+            dna_rows.append({
+                'ID1': person_id_1,
+                'ID2': person_id_2,
+                'Label1': label1,
+                'Label2': label2,
+                'DNAProvider': data.get('DNAProvider'),
+                'SharedCM': shared_cm,
+                'SharedPercent': round(shared_cm / 69, 2) if shared_cm else None,
+                'SharedSegs': data.get('SharedSegs'),
+                'Date': date,
+                'Note': note,
+            })
+
+            if batch_size > 0 and len(dna_rows) >= batch_size:
+                processed_count += write_dna_batch(dna_rm_session, dna_rows)
+                dna_rows = []
+
+        if dna_rows:
+            processed_count += write_dna_batch(dna_rm_session, dna_rows)
 
-        dna_rm_session.commit()
         logging.info(f"Processed {processed_count} DNA records.")
 
     except Exception as e:
         logging.error(f"Error inserting or updating DNATable: {e}")
         logging.error(traceback.format_exc())
-        dna_rm_session.rollback()
         raise
-    finally:
-        dna_rm_session.close()
 
 
-def insert_events(event_rm_session: Session, processed_data, batch_size=limit):
-    logger = logging.getLogger('insert_events')
-    # logger.info("Inserting or updating places and events...")
-
-    def transform_date(date_str):
-        if not date_str:
-            return "."
-
-        date_str = date_str.strip().lower()
-
-        # Check if the date is already in YYYY-MM-DD format
-        if re.match(r"^\d{4}-\d{2}-\d{2}$", date_str):
-            year, month, day = date_str.split('-')
-            return f"D.+{year}{month}{day}.+00000000.."
-
-        # Define month mapping
-        month_map = {
-            "jan": "01", "feb": "02", "mar": "03", "apr": "04",
-            "may": "05", "jun": "06", "jul": "07", "aug": "08",
-            "sep": "09", "oct": "10", "nov": "11", "dec": "12",
-            "january": "01", "february": "02", "march": "03", "april": "04",
-            "june": "06", "july": "07", "august": "08", "september": "09",
-            "october": "10", "november": "11", "december": "12"
-        }
-
-        # Regular expressions for different date formats
-        full_date_re = r"^(?P<day>\d{1,2}) (?P<month>\w{3,9}) (?P<year>-?\d{1,4})(?: bc)?$"
-        month_year_re = r"^(?P<month>\w{3,9}) (?P<year>-?\d{1,4})(?: bc)?$"
-        year_only_re = r"^(?P<year>-?\d{1,4})(?: bc)?$"
-        day_month_re = r"^(?P<day>\d{1,2}) (?P<month>\w{3,9})$"
-        month_only_re = r"^(?P<month>\w{3,9})$"
-        between_years_re = (r"^(t?between|bet) (?P<start_year>-?\d{1,4})(?: bc)? "
-                            r"(and|-) (?P<end_year>-?\d{1,4})(?: bc)?$")
-        double_date_re = r"^(?P<day>\d{1,2}) (?P<month>\w{3,9}) (?P<year>\d{4})/(?P<alt_year>\d{2})$"
-        quaker_date_re = r"^(?P<day>\d{1,2})da (?P<month>\d{1,2})mo (?P<year>\d{4})$"
-
-        # Date qualifiers and modifiers
-        qualifiers = {
-            "abt": "A", "about": "A", "est": "E", "calc": "L", "ca": "C", "say": "S"
-        }
+# Month names and the date qualifiers and modifiers understood by transform_date
+MONTH_MAP = {
+    "jan": "01", "feb": "02", "mar": "03", "apr": "04",
+    "may": "05", "jun": "06", "jul": "07", "aug": "08",
+    "sep": "09", "oct": "10", "nov": "11", "dec": "12",
+    "january": "01", "february": "02", "march": "03", "april": "04",
+    "june": "06", "july": "07", "august": "08", "september": "09",
+    "october": "10", "november": "11", "december": "12"
+}
+
+DATE_QUALIFIERS = {
+    "abt": "A", "about": "A", "est": "E", "calc": "L", "ca": "C", "say": "S"
+}
+
+DATE_DIRECTIONAL_MODIFIERS = {
+    "bef.": "B", "bef": "B", "before": "B", "by": "Y", "to": "T", "until": "U",
+    "from": "F", "since": "I", "aft": "A", "after": "A"
+}
+
+DATE_QUALITATIVE_MODIFIERS = {
+    "cert": "6", "prob": "5", "poss": "4", "lkly": "3", "appar": "2", "prhps": "1", "maybe": "?"
+}
+
+
+# Compile a (match, strip) pattern pair and its code for each date prefix, in lookup order
+def compile_date_prefixes(prefixes):
+    return [(re.compile(rf"^{re.escape(prefix)}\W"), re.compile(rf"^{re.escape(prefix)}\W*"), code)
+            for prefix, code in prefixes.items()]
+
+
+QUALIFIER_PATTERNS = compile_date_prefixes(DATE_QUALIFIERS)
+DIRECTIONAL_MODIFIER_PATTERNS = compile_date_prefixes(DATE_DIRECTIONAL_MODIFIERS)
+QUALITATIVE_MODIFIER_PATTERNS = compile_date_prefixes(DATE_QUALITATIVE_MODIFIERS)
+
+# Regular expressions for different date formats
+ISO_DATE_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+FULL_DATE_RE = re.compile(r"^(?P<day>\d{1,2}) (?P<month>\w{3,9}) (?P<year>-?\d{1,4})(?: bc)?$")
+MONTH_YEAR_RE = re.compile(r"^(?P<month>\w{3,9}) (?P<year>-?\d{1,4})(?: bc)?$")
+YEAR_ONLY_RE = re.compile(r"^(?P<year>-?\d{1,4})(?: bc)?$")
+DAY_MONTH_RE = re.compile(r"^(?P<day>\d{1,2}) (?P<month>\w{3,9})$")
+MONTH_ONLY_RE = re.compile(r"^(?P<month>\w{3,9})$")
+BETWEEN_YEARS_RE = re.compile(r"^(t?between|bet) (?P<start_year>-?\d{1,4})(?: bc)? "
+                              r"(and|-) (?P<end_year>-?\d{1,4})(?: bc)?$")
+DOUBLE_DATE_RE = re.compile(r"^(?P<day>\d{1,2}) (?P<month>\w{3,9}) (?P<year>\d{4})/(?P<alt_year>\d{2})$")
+QUAKER_DATE_RE = re.compile(r"^(?P<day>\d{1,2})da (?P<month>\d{1,2})mo (?P<year>\d{4})$")
+
+
+def format_date(f_year, f_month, f_day, f_bc=False, double_date=False, quaker=False):
+    f_year = f_year.zfill(4) if f_year else "0000"
+    f_month = f_month.zfill(2) if f_month else "00"
+    f_day = f_day.zfill(2) if f_day else "00"
+
+    date_type = "Q" if quaker else "D"
+    bc_sign = "-" if f_bc else "+"
+    double_date_sign = "/" if double_date else "."
+
+    return f"{date_type}.{bc_sign}{f_year}{f_month}{f_day}{double_date_sign}.+00000000.."
+
+
+# Convert a DNAGedcom date string to a RootsMagic date code
+def transform_date(date_str):
+    if not date_str:
+        return "."
+
+    return transform_normalized_date(date_str.strip().lower())
+
+
+# Parse a stripped, lower-cased date string. Genealogy dates repeat heavily, so results are memoized.
+@lru_cache(maxsize=65536)
+def transform_normalized_date(date_str):
+    # Check if the date is already in YYYY-MM-DD format
+    if ISO_DATE_RE.match(date_str):
+        year, month, day = date_str.split('-')
+        return f"D.+{year}{month}{day}.+00000000.."
+
+    for match_re, strip_re, code in QUALIFIER_PATTERNS:
+        if match_re.match(date_str):
+            date_code = transform_date(strip_re.sub("", date_str).strip())
+            return f"{date_code[:12]}{code}{date_code[13:]}"
+
+    for match_re, strip_re, code in DIRECTIONAL_MODIFIER_PATTERNS:
+        if match_re.match(date_str):
+            date_code = transform_date(strip_re.sub("", date_str).strip())
+            return f"{date_code[:1]}{code}{date_code[2:]}"
+
+    for match_re, strip_re, code in QUALITATIVE_MODIFIER_PATTERNS:
+        if match_re.match(date_str):
+            date_code = transform_date(strip_re.sub("", date_str).strip())
+            return f"{date_code[:12]}{code}{date_code[13:]}"
+
+    # Handle full date
+    match = FULL_DATE_RE.match(date_str)
+    if match:
+        day = match.group("day")
+        month = MONTH_MAP.get(match.group("month"), "00")
+        year = match.group("year")
+        bc = "bc" in date_str
+        return format_date(year, month, day, bc)
+
+    # Handle month and year
+    match = MONTH_YEAR_RE.match(date_str)
+    if match:
+        month = MONTH_MAP.get(match.group("month"), "00")
+        year = match.group("year")
+        bc = "bc" in date_str
+        return format_date(year, month, None, bc)
+
+    # Handle year only
+    match = YEAR_ONLY_RE.match(date_str)
+    if match:
+        year = match.group("year")
+        bc = "bc" in date_str
+        return format_date(year, None, None, bc)
+
+    # Handle day and month only
+    match = DAY_MONTH_RE.match(date_str)
+    if match:
+        day = match.group("day")
+        month = MONTH_MAP.get(match.group("month"), "00")
+        return format_date(None, month, day)
+
+    # Handle month only
+    match = MONTH_ONLY_RE.match(date_str)
+    if match:
+        month = MONTH_MAP.get(match.group("month"), "00")
+        return format_date(None, month, None)
+
+    # Handle double dates
+    match = DOUBLE_DATE_RE.match(date_str)
+    if match:
+        day = match.group("day")
+        month = MONTH_MAP.get(match.group("month"), "00")
+        year = match.group("year")
+        return format_date(year, month, day, double_date=True)
+
+    # Handle Quaker dates
+    match = QUAKER_DATE_RE.match(date_str)
+    if match:
+        day = match.group("day")
+        month = match.group("month")
+        year = match.group("year")
+        return format_date(year, month, day, quaker=True)
+
+    # Handle "between" years
+    match = BETWEEN_YEARS_RE.match(date_str)
+    if match:
+        start_year = match.group("start_year")
+        end_year = match.group("end_year")
+        start_bc = "bc" in date_str.split("and")[0]
+        end_bc = "bc" in date_str.split("and")[1]
+        start_sign = "-" if start_bc else "+"
+        end_sign = "-" if end_bc else "+"
+        return f"R.{start_sign}{start_year.zfill(4)}0000..{end_sign}{end_year.zfill(4)}0000.."
+
+    # Default to text date
+    return f"T{date_str}"
+
+
+# Convert a column of DNAGedcom date strings, parsing each distinct value once. Values that fail to parse map to None.
+def transform_dates(date_strs):
+    logger = logging.getLogger('transform_dates')
+    date_codes = {}
+
+    for date_str in set(date_strs):
+        try:
+            date_codes[date_str] = transform_date(date_str)
+        except Exception as e:
+            logger.error(f"Error transforming date {date_str!r}: {e}")
+            date_codes[date_str] = None
 
-        # Directional modifiers
-        directional_modifiers = {
-            "bef.": "B", "bef": "B", "before": "B", "by": "Y", "to": "T", "until": "U",
-            "from": "F", "since": "I", "aft": "A", "after": "A"
-        }
+    return [date_codes[date_str] for date_str in date_strs]
 
-        # Qualitative modifiers
-        qualitative_modifiers = {
-            "cert": "6", "prob": "5", "poss": "4", "lkly": "3", "appar": "2", "prhps": "1", "maybe": "?"
-        }
 
-        def format_date(f_year, f_month, f_day, f_bc=False, double_date=False, quaker=False):
-            f_year = f_year.zfill(4) if f_year else "0000"
-            f_month = f_month.zfill(2) if f_month else "00"
-            f_day = f_day.zfill(2) if f_day else "00"
-
-            date_type = "Q" if quaker else "D"
-            bc_sign = "-" if f_bc else "+"
-            double_date_sign = "/" if double_date else "."
-
-            return f"{date_type}.{bc_sign}{f_year}{f_month}{f_day}{double_date_sign}.+00000000.."
-
-        for qual, code in qualifiers.items():
-            if re.match(rf"^{re.escape(qual)}\W", date_str):
-                date_str = re.sub(rf"^{re.escape(qual)}\W*", "", date_str).strip()
-                date_code = transform_date(date_str)
-                return f"{date_code[:12]}{code}{date_code[13:]}"
-
-        for mod, code in directional_modifiers.items():
-            if re.match(rf"^{re.escape(mod)}\W", date_str):
-                date_str = re.sub(rf"^{re.escape(mod)}\W*", "", date_str).strip()
-                date_code = transform_date(date_str)
-                return f"{date_code[:1]}{code}{date_code[2:]}"
-
-        for mod, code in qualitative_modifiers.items():
-            if re.match(rf"^{re.escape(mod)}\W", date_str):
-                date_str = re.sub(rf"^{re.escape(mod)}\W*", "", date_str).strip()
-                date_code = transform_date(date_str)
-                return f"{date_code[:12]}{code}{date_code[13:]}"
-
-        # Handle full date
-        match = re.match(full_date_re, date_str)
-        if match:
-            day = match.group("day")
-            month = month_map.get(match.group("month"), "00")
-            year = match.group("year")
-            bc = "bc" in date_str
-            return format_date(year, month, day, bc)
-
-        # Handle month and year
-        match = re.match(month_year_re, date_str)
-        if match:
-            month = month_map.get(match.group("month"), "00")
-            year = match.group("year")
-            bc = "bc" in date_str
-            return format_date(year, month, None, bc)
-
-        # Handle year only
-        match = re.match(year_only_re, date_str)
-        if match:
-            year = match.group("year")
-            bc = "bc" in date_str
-            return format_date(year, None, None, bc)
-
-        # Handle day and month only
-        match = re.match(day_month_re, date_str)
-        if match:
-            day = match.group("day")
-            month = month_map.get(match.group("month"), "00")
-            return format_date(None, month, day)
-
-        # Handle month only
-        match = re.match(month_only_re, date_str)
-        if match:
-            month = month_map.get(match.group("month"), "00")
-            return format_date(None, month, None)
-
-        # Handle double dates
-        match = re.match(double_date_re, date_str)
-        if match:
-            day = match.group("day")
-            month = month_map.get(match.group("month"), "00")
-            year = match.group("year")
-            return format_date(year, month, day, double_date=True)
-
-        # Handle Quaker dates
-        match = re.match(quaker_date_re, date_str)
-        if match:
-            day = match.group("day")
-            month = match.group("month")
-            year = match.group("year")
-            return format_date(year, month, day, quaker=True)
-
-        # Handle "between" years
-        match = re.match(between_years_re, date_str)
-        if match:
-            start_year = match.group("start_year")
-            end_year = match.group("end_year")
-            start_bc = "bc" in date_str.split("and")[0]
-            end_bc = "bc" in date_str.split("and")[1]
-            start_sign = "-" if start_bc else "+"
-            end_sign = "-" if end_bc else "+"
-            return f"R.{start_sign}{start_year.zfill(4)}0000..{end_sign}{end_year.zfill(4)}0000.."
-
-        # Default to text date
-        return f"T{date_str}"
+def insert_events(event_rm_session: Session, processed_data, batch_size=limit):
+    logger = logging.getLogger('insert_events')
+    # logger.info("Inserting or updating places and events...")
 
+    utc_mod_date = rm_utc_mod_date()
     try:
         processed_count = 0
+        event_records = []
 
         for data in processed_data:
-            if data.get('source') == 'process_icw':
+            if data is None:
+                logger.warning("Encountered None data entry, skipping...")
                 continue
-            try:
-                if data is None:
-                    logger.warning("Encountered None data entry, skipping...")
-                    continue
 
-                person_id = data.get('PersonID')
-                if person_id is None:
-                    logger.warning(f"Missing PersonID in data: {data}")
-                    continue
+            person_id = data.get('PersonID')
+            if person_id is None:
+                logger.warning(f"Missing PersonID in data: {data}")
+                continue
 
-                # Ensure person_id is an integer
-                try:
-                    person_id = int(person_id)
-                except ValueError:
-                    logger.warning(f"Invalid PersonID: {person_id}. Skipping this record.")
-                    continue
+            # Ensure person_id is an integer
+            try:
+                person_id = int(person_id)
+            except ValueError:
+                logger.warning(f"Invalid PersonID: {person_id}. Skipping this record.")
+                continue
 
-                # Insert or update places
-                place_ids = {}
-                for place_type in ['birthplace', 'deathplace']:
-                    place_name = data.get(place_type)
-                    if place_name is None:
-                        # logger.warning(f"Missing {place_type} in data: {data}")
-                        continue
+            event_records.append((person_id, data))
 
-                    existing_place = event_rm_session.query(PlaceTable).filter_by(Name=place_name).first()
+        # Insert or update the places of the whole batch at once
+        place_index = resolve_place_ids(event_rm_session, [
+            data.get(place_type) for _, data in event_records for place_type in ['birthplace', 'deathplace']])
 
-                    if existing_place:
-                        existing_place.UTCModDate = func.julianday(func.current_timestamp()) - 2415018.5
-                        # logger.info(f"Updated existing place record for Name: {place_name}")
-                        place_ids[place_type] = existing_place.PlaceID
-                    else:
-                        new_place = PlaceTable(
-                            Name=place_name,
-                            PlaceType=0,
-                            MasterID=0,
-                            fsID=0,
-                            anID=0,
-                            Latitude=0,
-                            Longitude=0,
-                            LatLongExact=0,
-                            UTCModDate=func.julianday(func.current_timestamp()) - 2415018.5
-                        )
-                        event_rm_session.add(new_place)
-                        event_rm_session.flush()
-                        # logger.info(f"Inserted new place record for Name: {place_name}")
-                        place_ids[place_type] = new_place.PlaceID
+        # Convert the date columns of the whole batch at once
+        event_dates = {event_type: transform_dates([data.get(event_type) for _, data in event_records])
+                       for event_type in ['birthdate', 'deathdate']}
+
+        for record_index, (person_id, data) in enumerate(event_records):
+            try:
+                place_ids = {place_type: place_index[data[place_type].lower()]
+                             for place_type in ['birthplace', 'deathplace'] if data.get(place_type) is not None}
 
                 # Insert or update events
                 for event_type in ['birthdate', 'deathdate']:
@@ -2438,14 +3169,16 @@ def insert_events(event_rm_session: Session, processed_data, batch_size=limit):
                         # logger.warning(f"Missing {event_type} in data: {data}")
                         continue
 
-                    event_date = transform_date(raw_event_date)
+                    event_date = event_dates[event_type][record_index]
+                    if event_date is None:
+                        continue
 
                     existing_event = event_rm_session.query(EventTable).filter_by(
                         OwnerID=person_id, EventType=event_type_map[event_type]).first()
 
                     if existing_event:
                         existing_event.Date = event_date
-                        existing_event.UTCModDate = func.julianday(func.current_timestamp()) - 2415018.5
+                        existing_event.UTCModDate = utc_mod_date
                         # logger.info(
                         # f"Updated existing event record for OwnerID: "
                         # f"{person_id} and EventType: {event_type_map[event_type]}")
@@ -2462,7 +3195,7 @@ def insert_events(event_rm_session: Session, processed_data, batch_size=limit):
                             IsPrivate=0,
                             Proof=0,
                             Status=0,
-                            UTCModDate=func.julianday(func.current_timestamp()) - 2415018.5
+                            UTCModDate=utc_mod_date
                         )
                         event_rm_session.add(new_event)
                         # logger.info(
@@ -2477,16 +3210,12 @@ def insert_events(event_rm_session: Session, processed_data, batch_size=limit):
                 logger.error(f"Error processing data {data}: {inner_e}")
                 logger.error(traceback.format_exc())
 
-        event_rm_session.commit()
         logger.info(f"Processed {processed_count} event records.")
 
     except Exception as e:
         logger.error(f"Error inserting or updating EventTable and PlaceTable: {e}")
         logger.error(traceback.format_exc())
-        event_rm_session.rollback()
         raise
-    finally:
-        event_rm_session.close()
 
 
 # Import data into RootsMagic GroupTable
@@ -2494,6 +3223,7 @@ def insert_group(group_rm_session: Session, processed_data, batch_size=limit):
     logging.getLogger('insert_group')
     # logging.info("Inserting or updating group data in GroupTable...")
 
+    utc_mod_date = rm_utc_mod_date()
     try:
         processed_count = 0
 
@@ -2506,7 +3236,7 @@ def insert_group(group_rm_session: Session, processed_data, batch_size=limit):
                 # Update existing record
                 for key, value in data.items():
                     setattr(existing_group, key, value)
-                existing_group.UTCModDate = func.julianday(func.current_timestamp()) - 2415018.5
+                existing_group.UTCModDate = utc_mod_date
                 logging.info(f"Updated existing group record for GroupID: {data['GroupID']}")
             else:
                 # Create new record in GroupTable
@@ -2514,7 +3244,7 @@ def insert_group(group_rm_session: Session, processed_data, batch_size=limit):
                     'GroupID': data.get('GroupID', None),
                     'StartID': data.get('StartID', None),
                     'EndID': data.get('EndID', None),
-                    'UTCModDate': func.julianday(func.current_timestamp()) - 2415018.5,
+                    'UTCModDate': utc_mod_date,
                 }
                 new_group = GroupTable(**group_data)
                 group_rm_session.add(new_group)
@@ -2524,16 +3254,12 @@ def insert_group(group_rm_session: Session, processed_data, batch_size=limit):
             if batch_size > 0 and processed_count % batch_size == 0:
                 group_rm_session.flush()
 
-        group_rm_session.commit()
         logging.info(f"Processed {processed_count} group records.")
 
     except Exception as e:
         logging.error(f"Error inserting or updating GroupTable: {e}")
         logging.error(traceback.format_exc())
-        group_rm_session.rollback()
         raise
-    finally:
-        group_rm_session.close()
 
 
 # Import data into RootsMagic URLTable
@@ -2541,6 +3267,7 @@ def insert_url(url_rm_session: Session, processed_data, batch_size=limit):
     logging.getLogger('insert_url')
     # logging.info("Inserting or updating URL data in URLTable...")
 
+    utc_mod_date = rm_utc_mod_date()
     try:
         processed_count = 0
 
@@ -2553,7 +3280,7 @@ def insert_url(url_rm_session: Session, processed_data, batch_size=limit):
                 # Update existing record
                 for key, value in data.items():
                     setattr(existing_url, key, value)
-                existing_url.UTCModDate = func.julianday(func.current_timestamp()) - 2415018.5
+                existing_url.UTCModDate = utc_mod_date
                 logging.info(
                     f"Updated existing URL record for OwnerType {data['OwnerType']} and OwnerID {data['OwnerID']}")
             else:
@@ -2565,7 +3292,7 @@ def insert_url(url_rm_session: Session, processed_data, batch_size=limit):
                     'Name': data.get('Name', None),
                     'URL': data.get('URL', None),
                     'Note': data.get('Note', None),
-                    'UTCModDate': func.julianday(func.current_timestamp()) - 2415018.5,
+                    'UTCModDate': utc_mod_date,
                 }
                 new_url = URLTable(**url_data)
                 url_rm_session.add(new_url)
@@ -2575,36 +3302,223 @@ def insert_url(url_rm_session: Session, processed_data, batch_size=limit):
             if batch_size > 0 and processed_count % batch_size == 0:
                 url_rm_session.flush()
 
-        url_rm_session.commit()
         logging.info(f"Processed {processed_count} URL records.")
 
     except Exception as e:
         logging.error(f"Error inserting or updating URLTable: {e}")
         logging.error(traceback.format_exc())
-        url_rm_session.rollback()
         raise
-    finally:
-        url_rm_session.close()
 
 
-def rebuild_all_indexes(engine):
-    inspector = inspect(engine)
-
-    tables_indexes = [
-        (ChildTable, ['idxChildOrder', 'idxChildID', 'idxChildFamilyID']),
-        (DNATable, ['idxDnaId2', 'idxDnaId1']),
-        (EventTable, ['idxOwnerEvent', 'idxOwnerDate']),
-        (FactTypeTable, ['idxFactTypeName', 'idxFactTypeAbbrev', 'idxFactTypeGedcomTag']),
-        (FamilyTable, ['idxFamilyMotherID', 'idxFamilyFatherID']),
-        (NameTable,
-         ['idxSurnameGiven', 'idxSurnameGivenMP', 'idxNamePrimary', 'idxGivenMP', 'idxNameOwnerID', 'idxGiven',
-          'idxSurname', 'idxSurnameMP']),
-        (PlaceTable, ['idxPlaceName', 'idxPlaceAbbrev', 'idxReversePlaceName']),
-        (URLTable, ['idxUrlOwnerID', 'idxUrlOwnerType']),
+# Record type of each processor's output. FTDNA and MyHeritage records carry no source and are provider records.
+RECORD_TYPES = {
+    'process_matchgroup': 'match_person',
+    'process_matchtree': 'tree_person',
+    'process_icw': 'icw_edge',
+    'process_treedata': 'tree_metadata',
+    'process_matchethnicity': 'ethnicity',
+    'process_ancestorcouple': 'ancestor_couple',
+}
+
+# Record types consumed by each write stage. Tree metadata, ethnicity and ancestor couples are not written yet.
+STAGE_RECORD_TYPES = {
+    'person': {'match_person', 'tree_person', 'provider'},
+    'name': {'match_person', 'tree_person', 'provider'},
+    'family': {'match_person', 'tree_person', 'provider'},
+    'child': {'match_person', 'tree_person', 'provider'},
+    'dna': {'match_person', 'icw_edge'},
+    'events': {'match_person', 'tree_person', 'provider'},
+}
+
+
+# Partition processed records in one pass into the records each write stage consumes, keeping their order
+def route_records(processed_data):
+    routed = {stage: [] for stage in STAGE_RECORD_TYPES}
+    stage_routes = {}
+
+    for data in processed_data:
+        if data is None:
+            continue
+        record_type = RECORD_TYPES.get(data.get('source'), 'provider')
+        if record_type not in stage_routes:
+            stage_routes[record_type] = [routed[stage] for stage, record_types in STAGE_RECORD_TYPES.items()
+                                         if record_type in record_types]
+        for records in stage_routes[record_type]:
+            records.append(data)
+
+    return routed
+
+
+# Run every RootsMagic write stage over the processed records, in dependency order.
+def write_rm_records(rm_session: Session, processed_data, selected_kits, pbar=None):
+    routed = route_records(processed_data)
+
+    # Map the DNAGedcom person ids of the batch to PersonIDs before any stage writes them
+    with rm_session.begin_nested():
+        resolve_person_ids(rm_session, routed['person'])
+
+    stages = [
+        ("Inserting persons...", lambda: insert_person(rm_session, routed['person'])),
+        ("Inserting names...", lambda: insert_name(rm_session, routed['name'])),
+        ("Inserting families...", lambda: insert_family(rm_session, routed['family'])),
+        ("Inserting children...", lambda: insert_child(rm_session, routed['child'])),
+        ("Inserting DNA records...", lambda: insert_dna(rm_session, routed['dna'], selected_kits)),
+        ("Inserting events...", lambda: insert_events(rm_session, routed['events'])),
     ]
 
+    # The write phase runs in one transaction. A failing stage rolls back to its savepoint and re-raises.
+    for message, stage in stages:
+        if pbar is not None:
+            logging.info(message)
+        with rm_session.begin_nested():
+            stage()
+        if pbar is not None:
+            pbar.update(1)
+
+
+# Batches a pipeline reader may have transformed ahead of the writer, per provider
+PIPELINE_QUEUE_SIZE = 4
+# Put on a reader's queue after its last batch
+PIPELINE_DONE = object()
+
+
+# Pipeline reader thread: stream one provider on its own read-only DNAGedcom connection into batch_queue, then put
+# PIPELINE_DONE, or the exception that stopped it. Gives up once stop_event is set.
+def pipeline_reader(provider, dg_db_path, selected_kits, batch_queue, stop_event):
+    def put(item):
+        while not stop_event.is_set():
+            try:
+                batch_queue.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    try:
+        dg_session, dg_engine = connect_to_dg_readonly(dg_db_path)
+        try:
+            filtered_ids = filter_selected_kits(dg_session, selected_kits)
+            for batch in stream_provider(dg_session, provider, filtered_ids, dg_db_path, selected_kits):
+                if not put(batch):
+                    return
+        finally:
+            dg_session.close()
+            dg_engine.dispose()
+    except Exception as e:
+        logging.error(f"An error occurred while reading {provider} data: {str(e)}")
+        logging.error(traceback.format_exc())
+        put(e)
+        return
+    put(PIPELINE_DONE)
+
+
+# Write the providers' batches while reader threads fetch and transform the next ones. Batches are written in
+# PROVIDER_STREAMS order, as in stream mode, so parents written after their family are linked through
+# pending_spouse_links and the result matches a non-stream run. A reader's exception is raised here.
+def write_rm_records_pipelined(rm_session: Session, dg_db_path, selected_kits):
+    stop_event = threading.Event()
+    batch_queues = {provider: queue.Queue(maxsize=PIPELINE_QUEUE_SIZE) for provider in PROVIDER_STREAMS}
+    readers = [threading.Thread(target=pipeline_reader, name=f"pipeline-{provider}",
+                                args=(provider, dg_db_path, selected_kits, batch_queue, stop_event))
+               for provider, batch_queue in batch_queues.items()]
+    for reader in readers:
+        reader.start()
+
+    try:
+        with tqdm(desc="Pipelined batches", leave=False) as batch_pbar:
+            for provider, batch_queue in batch_queues.items():
+                logging.info(f"Writing {provider} data...")
+                while True:
+                    batch = batch_queue.get()
+                    if batch is PIPELINE_DONE:
+                        break
+                    if isinstance(batch, Exception):
+                        raise batch
+                    write_rm_records(rm_session, batch, selected_kits)
+                    batch_pbar.update(1)
+    finally:
+        stop_event.set()
+        for reader in readers:
+            reader.join()
+
+
+# Indexes for the importer's own lookups that RootsMagic does not define. They exist only while the
+# write stages run and are dropped again before the file is handed back to RootsMagic. UniqueID lookups go
+# through the in-memory unique_id_index, so PersonTable gets no extra index.
+IMPORT_INDEXES = [
+    ('idxRootMatchItFamily',
+     'CREATE INDEX IF NOT EXISTS "idxRootMatchItFamily" ON "FamilyTable" ("FatherID", "MotherID", "ChildID")'),
+    ('idxRootMatchItChild', 'CREATE INDEX IF NOT EXISTS "idxRootMatchItChild" ON "ChildTable" ("ChildID", "FamilyID")'),
+]
+
+
+def create_import_indexes(engine):
+    with engine.begin() as conn:
+        for _, index_sql in IMPORT_INDEXES:
+            conn.execute(text(index_sql))
+
+
+def drop_import_indexes(engine):
+    with engine.begin() as conn:
+        for index_name, _ in IMPORT_INDEXES:
+            conn.execute(text(f'DROP INDEX IF EXISTS "{index_name}"'))
+
+
+# RootsMagic indexes maintained by the importer
+RM_TABLE_INDEXES = [
+    (ChildTable, ['idxChildOrder', 'idxChildID', 'idxChildFamilyID']),
+    (DNATable, ['idxDnaId2', 'idxDnaId1']),
+    (EventTable, ['idxOwnerEvent', 'idxOwnerDate']),
+    (FactTypeTable, ['idxFactTypeName', 'idxFactTypeAbbrev', 'idxFactTypeGedcomTag']),
+    (FamilyTable, ['idxFamilyMotherID', 'idxFamilyFatherID']),
+    (NameTable,
+     ['idxSurnameGiven', 'idxSurnameGivenMP', 'idxNamePrimary', 'idxGivenMP', 'idxNameOwnerID', 'idxGiven',
+      'idxSurname', 'idxSurnameMP']),
+    (PlaceTable, ['idxPlaceName', 'idxPlaceAbbrev', 'idxReversePlaceName']),
+    (URLTable, ['idxUrlOwnerID', 'idxUrlOwnerType']),
+]
+
+# Indexes the write stages query through, kept in place when defer_indexes is set
+DEFERRED_INDEX_KEEP = {'idxFamilyFatherID', 'idxFamilyMotherID', 'idxChildID', 'idxOwnerEvent'}
+
+
+# Drop the RootsMagic indexes the importer does not need during the load.
+# Returns their (name, sql) definitions as stored in sqlite_master so they can be recreated unchanged.
+def drop_deferred_indexes(engine):
+    deferred_indexes = []
+
+    with engine.begin() as conn:
+        for table, index_names in RM_TABLE_INDEXES:
+            for index_name in index_names:
+                if index_name in DEFERRED_INDEX_KEEP:
+                    continue
+                index_sql = conn.execute(
+                    text("SELECT sql FROM sqlite_master WHERE type = 'index' AND name = :name AND tbl_name = :table"),
+                    {'name': index_name, 'table': table.__tablename__}).scalar()
+                if index_sql is None:
+                    continue
+                conn.execute(text(f'DROP INDEX IF EXISTS "{index_name}"'))
+                deferred_indexes.append((index_name, index_sql))
+
+    logging.info(f"Dropped {len(deferred_indexes)} indexes for the import.")
+    return deferred_indexes
+
+
+# Build each index dropped by drop_deferred_indexes once, from its original definition
+def recreate_deferred_indexes(engine, deferred_indexes):
     with engine.begin() as conn:
-        for table, index_names in tables_indexes:
+        for index_name, index_sql in deferred_indexes:
+            conn.execute(text(f'DROP INDEX IF EXISTS "{index_name}"'))
+            conn.execute(text(index_sql))
+
+    logging.info(f"Recreated {len(deferred_indexes)} indexes.")
+
+
+def rebuild_all_indexes(engine):
+    with engine.begin() as conn:
+        # Reflect through the same connection. A second one would wait on this transaction's lock.
+        inspector = inspect(conn)
+        for table, index_names in RM_TABLE_INDEXES:
             table_name = table.__tablename__
             # print(f"Processing table: {table_name}")
 
@@ -2615,13 +3529,8 @@ def rebuild_all_indexes(engine):
                     conn.execute(text(f"DROP INDEX IF EXISTS {idx['name']}"))
                     # print(f"Dropped index {idx['name']} from {table_name}")
 
-            # Reindex the table
-            if engine.dialect.name == 'sqlite':
-                # For SQLite, the REINDEX command is used without specifying a table
-                conn.execute(text("REINDEX"))
-                # print(f"Reindexed all tables (SQLite)")
-            else:
-                # For other databases, specify the table
+            # Reindex the table. On SQLite the indexes outside RM_TABLE_INDEXES are reindexed once after the loop.
+            if engine.dialect.name != 'sqlite':
                 conn.execute(text(f"REINDEX TABLE {table_name}"))
                 # print(f"Reindexed table {table_name}")
 
@@ -2640,11 +3549,22 @@ def rebuild_all_indexes(engine):
                 conn.execute(text(f"ANALYZE {table_name}"))
                 # print(f"Analyzed table {table_name}")
 
+        if engine.dialect.name == 'sqlite':
+            # The indexes recreated above are already fresh, so REINDEX only the database's other indexes
+            recreated_indexes = {index_name for _, index_names in RM_TABLE_INDEXES for index_name in index_names}
+            other_indexes = [index_name for (index_name,) in conn.execute(
+                text("SELECT name FROM sqlite_master WHERE type = 'index' ORDER BY name"))
+                if index_name not in recreated_indexes]
+            for index_name in other_indexes:
+                conn.execute(text(f'REINDEX "{index_name}"'))
+            # print(f"Reindexed {len(other_indexes)} other indexes (SQLite)")
+
     # print("All indexes rebuilt and tables reindexed successfully")
 
 
 def main():
     setup_logging()
+    pending_spouse_links.clear()
     logging.info("Connecting to databases...")
     dnagedcom_db_path, rootsmagic_db_path = find_database_paths()
 
@@ -2655,79 +3575,111 @@ def main():
         logging.critical("Failed to connect to one or both databases using SQLAlchemy.")
         return
 
-    # logging.info("Fetching user kit data...")
-    dna_kits = user_kit_data(dg_session)
-
-    if dna_kits:
-        # logging.info("Prompting user for kits...")
-        selected_kits = prompt_user_for_kits(dna_kits)
-
-        logging.info("Selected kits:")
-        for kit in selected_kits:
-            logging.info(f"Type: {kit[0]}, GUID: {kit[1]}, Name: {kit[2]} {kit[3]}")
-
-        filtered_ids = filter_selected_kits(dg_session, selected_kits)
-        import_profiles(rm_session, selected_kits)
-
-        # Overall progress bar
-        with tqdm(total=11, desc="Overall Progress") as pbar:
-            try:
-                logging.info("Processing Ancestry data...")
-                processed_ancestry_data = process_ancestry(dg_session, filtered_ids)
-                pbar.update(1)
-
-                logging.info("Processing FTDNA data...")
-                processed_ftdna_data = process_ftdna(dg_session, filtered_ids)
-                pbar.update(1)
-
-                logging.info("Processing MyHeritage data...")
-                processed_mh_data = process_mh(dg_session, filtered_ids)
-                pbar.update(1)
-
-                processed_data = processed_ancestry_data + processed_ftdna_data + processed_mh_data
-
-                # logging.info("Inserting fact types...")
-                insert_fact_type(rm_session)
-                pbar.update(1)
-
-                logging.info("Inserting persons...")
-                insert_person(rm_session, processed_data)
-                pbar.update(1)
-
-                logging.info("Inserting names...")
-                insert_name(rm_session, processed_data)
-                pbar.update(1)
+    # The fast_import settings are put back however the import ends, so the file is never left in WAL mode
+    try:
+        # logging.info("Fetching user kit data...")
+        dna_kits = user_kit_data(dg_session)
 
-                logging.info("Inserting families...")
-                insert_family(rm_session, processed_data)
-                pbar.update(1)
+        if dna_kits:
+            # logging.info("Prompting user for kits...")
+            selected_kits = prompt_user_for_kits(dna_kits)
 
-                logging.info("Inserting children...")
-                insert_child(rm_session, processed_data)
-                pbar.update(1)
+            logging.info("Selected kits:")
+            for kit in selected_kits:
+                logging.info(f"Type: {kit[0]}, GUID: {kit[1]}, Name: {kit[2]} {kit[3]}")
 
-                logging.info("Inserting DNA records...")
-                insert_dna(rm_session, processed_data, selected_kits)
-                pbar.update(1)
+            filtered_ids = filter_selected_kits(dg_session, selected_kits)
+            import_profiles(rm_session, selected_kits)
 
-                logging.info("Inserting events...")
-                insert_events(rm_session, processed_data)
-                pbar.update(1)
-
-                logging.info("Rebuilding all indexes...")
-                rebuild_all_indexes(rm_engine)
-                pbar.update(1)
-            except Exception as e:
-                logging.error(f"Error during data insertion: {e}")
-                logging.error(traceback.format_exc())
-    else:
-        logging.warning("No kits found.")
-
-    # Close sessions and engines
-    dg_session.close()
-    dg_engine.dispose()
-    rm_session.close()
-    rm_engine.dispose()
+            # Overall progress bar
+            with tqdm(total=11, desc="Overall Progress") as pbar:
+                deferred_indexes = []
+                try:
+                    if defer_indexes:
+                        deferred_indexes = drop_deferred_indexes(rm_engine)
+
+                    create_import_indexes(rm_engine)
+                    try:
+                        if pipeline:
+                            # logging.info("Inserting fact types...")
+                            insert_fact_type(rm_session)
+                            load_unique_id_index(rm_session)
+                            pbar.update(1)
+
+                            write_rm_records_pipelined(rm_session, dnagedcom_db_path, selected_kits)
+                            pbar.update(9)
+                        elif stream:
+                            # logging.info("Inserting fact types...")
+                            insert_fact_type(rm_session)
+                            load_unique_id_index(rm_session)
+                            pbar.update(1)
+
+                            # Each batch goes through every write stage before the next one is read
+                            for batch in tqdm(stream_processed_data(dg_session, filtered_ids, dnagedcom_db_path,
+                                                                    selected_kits),
+                                              desc="Streamed batches", leave=False):
+                                write_rm_records(rm_session, batch, selected_kits)
+                            pbar.update(9)
+                        elif parallel_providers:
+                            logging.info("Processing provider data in parallel...")
+                            processed_data = process_providers_parallel(dnagedcom_db_path, selected_kits, pbar)
+
+                            # logging.info("Inserting fact types...")
+                            insert_fact_type(rm_session)
+                            load_unique_id_index(rm_session)
+                            pbar.update(1)
+
+                            write_rm_records(rm_session, processed_data, selected_kits, pbar)
+                        else:
+                            logging.info("Processing Ancestry data...")
+                            processed_ancestry_data = process_provider(dg_session, 'ancestry', filtered_ids,
+                                                                       dnagedcom_db_path, selected_kits)
+                            pbar.update(1)
+
+                            logging.info("Processing FTDNA data...")
+                            processed_ftdna_data = process_provider(dg_session, 'ftdna', filtered_ids,
+                                                                    dnagedcom_db_path, selected_kits)
+                            pbar.update(1)
+
+                            logging.info("Processing MyHeritage data...")
+                            processed_mh_data = process_provider(dg_session, 'mh', filtered_ids,
+                                                                 dnagedcom_db_path, selected_kits)
+                            pbar.update(1)
+
+                            processed_data = processed_ancestry_data + processed_ftdna_data + processed_mh_data
+
+                            # logging.info("Inserting fact types...")
+                            insert_fact_type(rm_session)
+                            load_unique_id_index(rm_session)
+                            pbar.update(1)
+
+                            write_rm_records(rm_session, processed_data, selected_kits, pbar)
+                    finally:
+                        commit_write_phase(rm_session)
+                        drop_import_indexes(rm_engine)
+
+                    if not defer_indexes:
+                        logging.info("Rebuilding all indexes...")
+                        rebuild_all_indexes(rm_engine)
+                    pbar.update(1)
+                except Exception as e:
+                    logging.error(f"Error during data insertion: {e}")
+                    logging.error(traceback.format_exc())
+                finally:
+                    if deferred_indexes:
+                        logging.info("Recreating deferred indexes...")
+                        recreate_deferred_indexes(rm_engine, deferred_indexes)
+        else:
+            logging.warning("No kits found.")
+    finally:
+        # Close sessions and engines
+        dg_session.close()
+        dg_engine.dispose()
+        rm_session.close()
+        rm_engine.dispose()
+
+        if fast_import:
+            restore_rm_pragmas(rootsmagic_db_path)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,72 @@
+import os
+import random
+import sqlite3
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import RootMatchIt  # noqa: E402
+
+# Benchmark a NameTable index rebuild with the original RMNOCASE collation and the current one.
+# Usage: python benchmarks/bench_rmnocase.py [rows] [repeats]
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+REPEATS = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+
+def lowering_collation(str1, str2):
+    return (str1.lower() > str2.lower()) - (str1.lower() < str2.lower())
+
+
+def build_name_table(collation):
+    conn = sqlite3.connect(":memory:")
+    conn.create_collation("RMNOCASE", collation)
+    conn.execute("CREATE TABLE NameTable (NameID INTEGER PRIMARY KEY, OwnerID INTEGER, "
+                 "Surname TEXT COLLATE RMNOCASE, Given TEXT COLLATE RMNOCASE, "
+                 "SurnameMP TEXT COLLATE RMNOCASE, GivenMP TEXT COLLATE RMNOCASE, "
+                 "BirthYear INTEGER, DeathYear INTEGER)")
+
+    rnd = random.Random(0)
+    surnames = ["".join(rnd.choice(string.ascii_letters) for _ in range(rnd.randint(3, 12))) for _ in range(5000)]
+    givens = ["".join(rnd.choice(string.ascii_letters) for _ in range(rnd.randint(3, 10))) for _ in range(2000)]
+    rows = []
+    for owner_id in range(ROWS):
+        surname = rnd.choice(surnames)
+        given = rnd.choice(givens)
+        rows.append((owner_id, surname, given, surname, given, rnd.randint(1700, 2000), rnd.randint(1750, 2024)))
+    conn.executemany("INSERT INTO NameTable (OwnerID, Surname, Given, SurnameMP, GivenMP, BirthYear, DeathYear) "
+                     "VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+    conn.execute("CREATE INDEX idxSurnameGiven ON NameTable (Surname, Given, BirthYear, DeathYear)")
+    conn.execute("CREATE INDEX idxSurnameGivenMP ON NameTable (SurnameMP, GivenMP, BirthYear, DeathYear)")
+    conn.execute("CREATE INDEX idxGivenMP ON NameTable (GivenMP)")
+    conn.execute("CREATE INDEX idxGiven ON NameTable (Given)")
+    conn.execute("CREATE INDEX idxSurname ON NameTable (Surname)")
+    conn.execute("CREATE INDEX idxSurnameMP ON NameTable (SurnameMP)")
+    conn.commit()
+    return conn
+
+
+def time_rebuild(name, collation):
+    conn = build_name_table(collation)
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        conn.execute("REINDEX NameTable")
+        timings.append(time.perf_counter() - start)
+    conn.close()
+    print(f"{name:<10} best {min(timings):.3f}s  mean {sum(timings) / len(timings):.3f}s")
+    return min(timings)
+
+
+def main():
+    print(f"NameTable rebuild, {ROWS} rows, {REPEATS} repeats")
+    before = time_rebuild("lower()", lowering_collation)
+    after = time_rebuild("current", RootMatchIt.rmnocase_collation)
+    print(f"Speedup: {before / after:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import os
+import random
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import RootMatchIt  # noqa: E402
+
+# Microbenchmark for UUIDv5 key generation on an FTDNA-style segment workload. As in the processors, every
+# (kit, match, chromosome) key is generated once, in a single pass.
+# Usage: python benchmarks/bench_unique_id.py [matches] [repeats]
+
+MATCHES = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+REPEATS = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+
+def uuid5_unique_id(*args) -> str:
+    filtered_args = [str(arg) for arg in args if arg]
+    unique_str = ' '.join(filtered_args)
+    return str(uuid.uuid5(uuid.NAMESPACE_DNS, unique_str))
+
+
+def build_keys():
+    rnd = random.Random(0)
+    kits = [f"B{rnd.randint(100000, 999999)}" for _ in range(2)]
+    keys = set()
+    for _ in range(MATCHES):
+        kit = rnd.choice(kits)
+        match = f"{rnd.randint(100000, 999999)}"
+        for chromosome in range(1, rnd.randint(2, 8)):
+            keys.add((kit, match, str(chromosome)))
+    return list(keys)
+
+
+def timed(name, func, keys):
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        result = [func(*args) for args in keys]
+        timings.append(time.perf_counter() - start)
+    best = min(timings)
+    print(f"{name:<20} best {best:.3f}s  ({len(keys) / best:,.0f} keys/s)")
+    return result, best
+
+
+def main():
+    keys = build_keys()
+    print(f"{len(keys)} distinct keys, single pass, best of {REPEATS}")
+
+    expected, before = timed("uuid.uuid5", uuid5_unique_id, keys)
+    generated, after = timed("generate_unique_id", RootMatchIt.generate_unique_id, keys)
+
+    assert generated == expected
+    print(f"Speedup: {before / after:.2f}x")
+
+
+if __name__ == "__main__":
+    main()